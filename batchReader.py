@@ -0,0 +1,156 @@
+"""
+This component of the program converts a whole set of HEC-RAS Report (.rep) files, e.g. one per plan run of a
+study, into a single merged CSV.
+
+Reports are parsed concurrently in a process pool and written to the output in the order the reports were given.
+Only as many reports as there are workers are in flight at a time, and the next one is started as each is written, so
+at most that many reports' rows are ever waiting to be written, however slow any one report is.  Every row is tagged
+with the report it came from and, if the report lists one, the title of its flow file.  Reports which fail to parse
+are reported and skipped without stopping the rest of the batch, as are reports whose worker process crashes: the
+pool is replaced, and each report lost with it is rerun in a process of its own, so that only the one which crashes
+it is skipped.
+
+The output format is the same as convertCSV with swmm = True and selective entries, with two extra leading columns:
+
+Report,Flow Title,River,Reach,RS,Profile,<entries>,SWMM Node
+"""
+
+import glob
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from reportWarnings import csvField
+from reportReader import parseReport, getDataForNodes, makeNodePfDataString, profileKeys, swmmLookup, splitStream, \
+    XS_MARKER
+
+# e.g. "Flow Title: Flow 01"; the flow title is taken from the part of the report before the first cross section
+FLOW_TITLE = re.compile(r"^\s*Flow Title\s*[:=]\s*(.*?)\s*$", re.MULTILINE)
+
+def reportPaths(pattern):
+    # Report files matching a glob pattern, or all .rep files in a directory, in sorted order
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.rep")
+    return sorted(glob.glob(pattern))
+
+def flowTitle(path):
+    # Title of the flow file a report was run with, or "" if the report doesn't list it
+    with open(path, "r") as f:
+        _, preamble = next(splitStream(f, XS_MARKER))
+    match = FLOW_TITLE.search(preamble)
+    return match.group(1) if match else ""
+
+def convertReport(args):
+    """
+    Worker for batchConvert: parse one report into tagged CSV lines.
+
+    :param args: (path, nodes, entries)
+    :return: a dictionary of the path, flow title, CSV lines, time taken in seconds, and the error message if parsing
+                failed (in which case there are no lines)
+    """
+    path, nodes, entries = args
+    start = time.perf_counter()
+    result = {"path": path, "title": "", "lines": [], "error": None}
+    try:
+        title = flowTitle(path)
+        tag = "%s,%s," % (csvField(os.path.basename(path)), csvField(title))
+        swmmNodes = swmmLookup(nodes)
+        for datum in getDataForNodes(parseReport(path, nodes, entries), nodes):
+            for pf in profileKeys(datum):
+                line = makeNodePfDataString(datum[pf], pf, datum, entries, True, nodes, swmmNodes)
+                result["lines"].append(tag + line)
+        result["title"] = title
+    except Exception as e:
+        result["lines"] = []
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def failedReport(path, error):
+    # convertReport result for a report which couldn't be parsed
+    return {"path": path, "title": "", "lines": [], "error": error, "seconds": 0.0}
+
+def submitReport(executor, job):
+    # Start convertReport on a job; if the pool is already broken, the future holds the error
+    try:
+        return executor.submit(convertReport, job)
+    except BrokenProcessPool as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+
+def isolatedReport(job):
+    # Run convertReport in a process of its own, so that if it crashes the process, only this report is lost
+    with ProcessPoolExecutor(max_workers = 1) as executor:
+        try:
+            return executor.submit(convertReport, job).result()
+        except BrokenProcessPool:
+            return failedReport(job[0], "BrokenProcessPool: the worker process crashed")
+
+def convertReports(jobs, workers = None):
+    # Yield the convertReport results of jobs in order, with at most workers reports in flight at a time
+    if workers == 1:
+        for job in jobs:
+            yield convertReport(job)
+        return
+    workers = workers or os.cpu_count() or 1
+    jobs = iter(jobs)
+    pending = deque()
+    executor = ProcessPoolExecutor(max_workers = workers)
+    try:
+        while True:
+            while len(pending) < workers:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                pending.append((job, submitReport(executor, job)))
+            if not pending:
+                return
+            job, future = pending.popleft()
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # A worker crashed, taking every report in flight with it; rerun this one alone, to tell whether it
+                # was the cause, and the rest in a new pool (where the same happens if one of them was)
+                executor.shutdown()
+                executor = ProcessPoolExecutor(max_workers = workers)
+                result = isolatedReport(job)
+                pending = deque([(job, submitReport(executor, job)) for job, _ in pending])
+            yield result
+    finally:
+        executor.shutdown()
+
+def batchConvert(pattern, nodes, entries, outpath, workers = None):
+    """
+    Parse every report matching pattern and write the data for the given nodes and entries to a single CSV.
+
+    :param pattern: a glob pattern for the report files, or a directory containing them
+    :param nodes: riverNode dictionaries of the nodes to extract
+    :param entries: the entries to extract, as for convertCSV with selective = True
+    :param outpath: the merged CSV path
+    :param workers: number of processes to use; defaults to the number of CPUs.  With 1, reports are parsed in this
+                    process.
+    :return: a list of per-report summaries: {"path", "title", "rows", "seconds", "error"}
+    """
+    paths = reportPaths(pattern)
+    jobs = [(path, nodes, entries) for path in paths]
+    summary = []
+    with open(outpath, "w") as f:
+        f.write("Report,Flow Title,River,Reach,RS,Profile," + ",".join(entries) + ",SWMM Node")
+        for result in convertReports(jobs, workers):
+            if result["error"] is not None:
+                print("Warning: report %s could not be parsed (%s)--skipping." % (result["path"], result["error"]))
+            else:
+                print("Parsed %s: %d rows in %.2f s" % (result["path"], len(result["lines"]), result["seconds"]))
+            for line in result["lines"]:
+                f.write("\n" + line)
+            summary.append({
+                "path": result["path"],
+                "title": result["title"],
+                "rows": len(result["lines"]),
+                "seconds": result["seconds"],
+                "error": result["error"]
+            })
+    return summary
@@ -0,0 +1,254 @@
+"""
+Benchmarks of the parsing and generating hot paths, on synthetic data so that they can be run anywhere (real reports
+are on network shares and can't be shared).
+
+The synthetic report follows the format documented at the top of reportReader.py, with a random mix of full and
+partially filled Left OB/Channel/Right OB rows and of profiles followed by warnings (some running onto a second line).
+The synthetic flow CSV follows the format documented in csvReader.py.  Both are generated from a seed, so the same
+sizes always give the same data, and scale with the number of nodes and profiles.
+
+Each benchmark is timed (best of several runs) and run once more under tracemalloc for its peak memory and, for the
+parsing benchmarks, the memory held by the parsed data, which shows the saving of compact records.  Throughput
+is reported in MB/s of input, cross sections/s and profiles/s, as applicable.  Results can be saved as a baseline, and
+later runs fail (exit status 1) if any benchmark is slower, or uses more memory, than its baseline by more than the
+tolerance.
+
+Usage:
+    python benchmark.py [--nodes N] [--profiles N] [--repeat N] [--baseline PATH] [--save] [--tolerance FRACTION]
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from csvReader import readCSVList, parseCSV, makeFlowData
+from profileWriter import buildFile, mkFlowData, mkFlowHeader, mkBoundaryData, constantBoundary
+from reportReader import riverNode, parseFile, buildCSV
+from utils import generatePermutedFlows
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+# Fractional slowdown (or memory increase) over the baseline which counts as a regression
+TOLERANCE = 0.25
+
+RIVERS = [("Compton Creek", "CC"), ("Rio Hondo Chnl", "RHC"), ("Upper LA River", "Above RH"),
+          ("Upper LA River", "RH to CC"), ("LA River", "Below CC")]
+LEFT_LABELS = ["E.G. Elev (ft)", "Vel Head (ft)", "W.S. Elev (ft)", "Crit W.S. (ft)", "E.G. Slope (ft/ft)",
+               "Q Total (cfs)", "Top Width (ft)", "Vel Total (ft/s)", "Max Chl Dpth (ft)", "Conv. Total (cfs)",
+               "Length Wtd. (ft)", "Min Ch El (ft)", "Alpha", "Frctn Loss (ft)", "C & E Loss (ft)"]
+RIGHT_LABELS = ["Element", "Wt. n-Val.", "Reach Len. (ft)", "Flow Area (sq ft)", "Area (sq ft)", "Flow (cfs)",
+                "Top Width (ft)", "Avg. Vel. (ft/s)", "Hydr. Depth (ft)", "Conv. (cfs)", "Wetted Per. (ft)",
+                "Shear (lb/sq ft)", "Stream Power (lb/ft s)", "Cum Volume (acre-ft)", "Cum SA (acres)"]
+ROW_FORMAT = "  %-18s%14s    %-22s%11s%11s%11s  "
+BLANK_LINE = " " * 95
+WARNINGS = [
+    "Warning: The energy equation could not be balanced within the specified number of iterations.  The program used "
+    "critical \n         depth for the water surface and continued on with the calculations.",
+    "Warning: The cross-section end points had to be extended vertically for the computed water surface.",
+    "Warning: Divided flow computed for this cross-section."
+]
+ENTRIES = ["Q Total (cfs)", "Avg. Vel. (ft/s)", "Max Chl Dpth (ft)", "Shear (lb/sq ft)", "Stream Power (lb/ft s)"]
+
+def syntheticNodes(nodes):
+    # riverNode dictionaries for a synthetic model, cycling through the LA River reaches with distinct stations
+    return [riverNode(RIVERS[ix % len(RIVERS)][0], RIVERS[ix % len(RIVERS)][1], "%.2f" % (90000 - 10 * ix))
+            for ix in range(0, nodes)]
+
+def syntheticReport(nodes, profiles, seed = 1):
+    # Text of a report with every profile at every node
+    rng = random.Random(seed)
+    out = ["HEC-RAS  Version 5.0.7 Mar 2019\nFlow Title: Flow 01\n\n"]
+    for node in syntheticNodes(nodes):
+        out.append("CROSS SECTION          \n\n\nRIVER: %s   \nREACH: %s                 RS: %s\n\n" % (
+            node["river"], node["reach"], node["rs"]))
+        for pf in range(1, profiles + 1):
+            out.append("\nCROSS SECTION OUTPUT  Profile #PF %d  \n%s\n" % (pf, BLANK_LINE))
+            for row in range(0, len(LEFT_LABELS)):
+                if row == 0:
+                    banks = ("Left OB", "Channel", "Right OB")
+                else:
+                    lob, mc, rob = ["%.2f" % rng.uniform(0, 100) for _ in range(0, 3)]
+                    banks = [(lob, mc, rob), ("", mc, ""), (lob, mc, ""), ("", mc, rob)][rng.randrange(4)]
+                out.append(ROW_FORMAT % ((LEFT_LABELS[row], "%.2f" % rng.uniform(0, 500), RIGHT_LABELS[row]) + banks))
+                out.append("\n")
+            out.append(BLANK_LINE + "\n\n")
+            if rng.random() < 0.3:
+                out.append(rng.choice(WARNINGS) + "\n")
+    return "".join(out)
+
+def syntheticFlowCSV(nodes, profiles, seed = 1):
+    # Text of a flow CSV with every profile at every node
+    rng = random.Random(seed)
+    lines = ["river,reach,rs,profilenumber,flow"]
+    for node in syntheticNodes(nodes):
+        prefix = "%s,%s,%s" % (node["river"], node["reach"], node["rs"])
+        lines += ["%s,%d,%f" % (prefix, pf, rng.uniform(1, 50000)) for pf in range(1, profiles + 1)]
+    return "\n".join(lines)
+
+def syntheticData(nodes, profiles, directory):
+    # Inputs for every benchmark, with the files written to directory
+    data = {"nodes": syntheticNodes(nodes), "nprofiles": profiles}
+    data["report"] = syntheticReport(nodes, profiles)
+    data["xsData"] = parseFile(data["report"], cache = False)
+    data["csvPath"] = os.path.join(directory, "flows.csv")
+    with open(data["csvPath"], "w") as f:
+        f.write(syntheticFlowCSV(nodes, profiles))
+    data["csvBytes"] = os.path.getsize(data["csvPath"])
+    data["profiledata"] = makeFlowData(parseCSV(readCSVList(data["csvPath"]), types = True, coltypes = {
+        "river": str, "reach": str, "rs": str, "profilenumber": int, "flow": float}))
+    data["bounddata"] = {"%s,%s" % river: constantBoundary(lambda pn, flow: mkBoundaryData("Junction", "Junction"))
+                         for river in RIVERS}
+    # Factorial design over the three headwaters of main.py, about as large as the other benchmarks
+    data["levels"] = max(2, int(round((nodes * profiles) ** (1.0 / 3))))
+    keys = [mkFlowHeader(river, reach, "1000") for river, reach in RIVERS]
+    data["permNodes"] = [riverNode(river, reach, "1000") for river, reach in RIVERS]
+    data["upstreamNodes"] = {keys[3]: [keys[1], keys[2]], keys[4]: [keys[0], keys[3]]}
+    return data
+
+def parseCounts(data, xsData):
+    # The parsed data is returned too, so that measure can find the memory it holds
+    return {"bytes": len(data["report"]), "crossSections": len(xsData), "profiles": len(xsData) * data["nprofiles"],
+            "kept": xsData}
+
+def benchParseFile(data):
+    return parseCounts(data, parseFile(data["report"], cache = False))
+
+def benchParseFileFixed(data):
+    return parseCounts(data, parseFile(data["report"], cache = False, engine = "fixed"))
+
+def benchParseFileCompact(data):
+    return parseCounts(data, parseFile(data["report"], cache = False, compact = True))
+
+def benchBuildCSV(data):
+    text = buildCSV(data["xsData"], data["nodes"], ENTRIES, selective = True, swmm = True)
+    return {"bytes": len(text), "crossSections": len(data["nodes"]), "profiles": len(data["nodes"]) * data["nprofiles"]}
+
+def benchParseCSV(data):
+    rows = parseCSV(readCSVList(data["csvPath"]), types = True, coltypes = {
+        "river": str, "reach": str, "rs": str, "profilenumber": int, "flow": float})
+    return {"bytes": data["csvBytes"], "profiles": len(rows)}
+
+def benchMkFlowData(data):
+    rows = [mkFlowData(flows) for flows in data["profiledata"].values()]
+    return {"bytes": sum([len(row) + 1 for block in rows for row in block]),
+            "profiles": len(data["profiledata"]) * data["nprofiles"]}
+
+def benchBuildFile(data):
+    text = buildFile(data["nprofiles"], data["profiledata"], data["bounddata"])
+    return {"bytes": len(text), "profiles": len(data["profiledata"]) * data["nprofiles"]}
+
+def benchGeneratePermutedFlows(data):
+    path = os.path.join(os.path.dirname(data["csvPath"]), "perms.csv")
+    flows = generatePermutedFlows([1.1 ** i for i in range(0, data["levels"])], data["permNodes"],
+                                  data["upstreamNodes"], write = True, path = path)
+    return {"bytes": os.path.getsize(path), "profiles": sum([len(f) for f in flows.values()])}
+
+BENCHMARKS = [
+    ("parseFile", benchParseFile),
+    ("parseFileFixed", benchParseFileFixed),
+    ("parseFileCompact", benchParseFileCompact),
+    ("buildCSV", benchBuildCSV),
+    ("parseCSV", benchParseCSV),
+    ("mkFlowData", benchMkFlowData),
+    ("buildFile", benchBuildFile),
+    ("generatePermutedFlows", benchGeneratePermutedFlows)
+]
+
+def measure(bench, data, repeat):
+    # Best time of repeat runs, throughput, and peak memory of one more run, as well as the memory still held by its
+    # result if the benchmark returns one as "kept"
+    times = []
+    for _ in range(0, repeat):
+        gc.collect()
+        start = time.perf_counter()
+        counts = bench(data)
+        times.append(time.perf_counter() - start)
+    counts.pop("kept", None)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = bench(data).pop("kept", None)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    seconds = min(times)
+    result = {"seconds": seconds, "peakMB": peak / 1e6, "MB/s": counts["bytes"] / 1e6 / seconds}
+    if kept is not None:
+        result["keptMB"] = current / 1e6
+    if "crossSections" in counts:
+        result["xs/s"] = counts["crossSections"] / seconds
+    result["profiles/s"] = counts["profiles"] / seconds
+    return result
+
+def regressions(results, baseline, tolerance):
+    # Descriptions of the results which are worse than the baseline by more than the tolerance
+    found = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key, label in [("seconds", "time"), ("peakMB", "peak memory"), ("keptMB", "kept memory")]:
+            if key in result and key in base and result[key] > base[key] * (1 + tolerance):
+                found.append("%s: %s %.3g vs baseline %.3g (+%.0f%%)" % (
+                    name, label, result[key], base[key], 100 * (result[key] / base[key] - 1)))
+    return found
+
+def runBenchmarks(nodes, profiles, repeat = 3, names = None):
+    # {benchmark name: results} for the given data sizes
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        data = syntheticData(nodes, profiles, directory)
+        for name, bench in BENCHMARKS:
+            if names is None or name in names:
+                results[name] = measure(bench, data, repeat)
+    return results
+
+def formatResults(results):
+    lines = ["%-22s %10s %10s %10s %10s %12s %12s" % ("Benchmark", "Seconds", "Peak MB", "Kept MB", "MB/s", "XS/s",
+                                                     "Profiles/s")]
+    for name, result in results.items():
+        lines.append("%-22s %10.3f %10.1f %10s %10.1f %12s %12.0f" % (
+            name, result["seconds"], result["peakMB"], "%.1f" % result["keptMB"] if "keptMB" in result else "",
+            result["MB/s"],
+            "%.0f" % result["xs/s"] if "xs/s" in result else "", result["profiles/s"]))
+    return "\n".join(lines)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = "Benchmark PyRASFile on synthetic data")
+    parser.add_argument("--nodes", type = int, default = 200, help = "number of nodes (cross sections)")
+    parser.add_argument("--profiles", type = int, default = 50, help = "number of profiles")
+    parser.add_argument("--repeat", type = int, default = 3, help = "timed runs of each benchmark")
+    parser.add_argument("--only", nargs = "*", help = "benchmarks to run (default: all)")
+    parser.add_argument("--baseline", default = BASELINE, help = "baseline JSON path")
+    parser.add_argument("--save", action = "store_true", help = "save the results as the baseline")
+    parser.add_argument("--tolerance", type = float, default = TOLERANCE,
+                        help = "fractional slowdown or memory increase counted as a regression")
+    args = parser.parse_args(argv)
+    results = runBenchmarks(args.nodes, args.profiles, args.repeat, args.only)
+    print(formatResults(results))
+    size = {"nodes": args.nodes, "profiles": args.profiles}
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"size": size, "results": results}, f, indent = 2)
+        print("Saved baseline to %s" % args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline at %s; run with --save to create one." % args.baseline)
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    if baseline["size"] != size:
+        print("Warning: baseline was run with %s, not %s--not compared." % (baseline["size"], size))
+        return 0
+    found = regressions(results, baseline["results"], args.tolerance)
+    for regression in found:
+        print("Regression: " + regression)
+    return 1 if found else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -17,8 +17,20 @@ The order of these can be varied (if specified in the relevant functions or if a
 but the names must remain the same.
 """
 
+import csv
+from array import array
+from itertools import islice
+from operator import itemgetter, methodcaller
+import numpy as np
+from metrics import stage, count
 from profileWriter import mkFlowHeader
 
+FLOW_COLUMNS = ["river", "reach", "rs", "profilenumber", "flow"]
+# Columns stored as categoricals by loadFlowColumns
+CATEGORY_COLUMNS = ["river", "reach", "rs"]
+# Rows converted at a time by loadFlowColumns
+CHUNK_ROWS = 65536
+
 def readCSVList(path):
     # Utility function - convert CSV into list
     with open(path, "r") as f:
@@ -89,23 +101,165 @@ def parseFlowCSV(path, header = True, columns = ["river", "reach", "rs", "profil
     }
     return parseCSVfile(path, header = header, columns = columns, types = True, coltypes = coltypes)
 
-def makeFlowData(csvDict):
-    result = {}
-    for entry in csvDict:
-        key = mkFlowHeader(entry["river"], entry["reach"], entry["rs"])
-        if not key in result.keys():
-            # the final format will be a list of lists, but we need to keep the profile numbers for now
-            # to make sure the order is correct
-            result[key] = {entry["profilenumber"]:entry["flow"]}
-        else:
-            result[key][entry["profilenumber"]] = entry["flow"]
-    for key in result.keys():
-        # Make sure they're in the correct order
-        entry = result[key]
-        keys = list(entry.keys())
-        keys.sort()
-        result[key] = [entry[k] for k in keys]
+def nodeCodes(csvDict):
+    # Flow headers of the nodes in a parsed flow CSV (list of dictionaries or FlowColumns), in the order they first
+    # appear, and the index of each row's node in that list
+    if isinstance(csvDict, FlowColumns):
+        # Combine the categorical codes, then intern the combinations
+        combined = np.stack([np.frombuffer(getattr(csvDict, col), dtype = np.intc) for col in CATEGORY_COLUMNS],
+                            axis = 1)
+        unique, first, inverse = np.unique(combined, axis = 0, return_index = True, return_inverse = True)
+        order = np.argsort(first)
+        rank = np.empty(len(order), dtype = np.intp)
+        rank[order] = np.arange(len(order))
+        nodes = [tuple(csvDict.levels[col][code] for col, code in zip(CATEGORY_COLUMNS, unique[ix])) for ix in order]
+        return [mkFlowHeader(*node) for node in nodes], nodes, rank[inverse.reshape(-1)]
+    keys = list(map(itemgetter("river", "reach", "rs"), csvDict))
+    nodes = list(dict.fromkeys(keys))
+    interned = {node: ix for ix, node in enumerate(nodes)}
+    codes = np.fromiter(map(interned.__getitem__, keys), dtype = np.intp, count = len(keys))
+    return [mkFlowHeader(*node) for node in nodes], nodes, codes
+
+def profileList(node, profiles):
+    return "%s (profiles %s)" % (" ".join(node), ", ".join([str(pn) for pn in profiles]))
+
+def makeFlowData(csvDict, metrics = None):
+    """
+    Convert a parsed flow CSV, as a list of dictionaries from parseFlowCSV or a FlowColumns from loadFlowColumns, into
+    the profiledata format for buildFile, with each node's flows in order of profile number.
+
+    Every node must have exactly one flow for every profile number from the lowest to the highest in the CSV;
+    otherwise a ValueError lists the missing or duplicated node/profile combinations.
+
+    If metrics (a RunMetrics; see metrics.py) is given, this is recorded as the "placement" stage.
+    """
+    with stage(metrics, "placement"):
+        return placeFlows(csvDict)
+
+def placeFlows(csvDict):
+    if len(csvDict) == 0:
+        return {}
+    headers, nodes, node = nodeCodes(csvDict)
+    if isinstance(csvDict, FlowColumns):
+        profile = np.frombuffer(csvDict.profilenumber, dtype = np.intc).astype(np.int64)
+        flow = np.frombuffer(csvDict.flow, dtype = np.float64)
+    else:
+        profile = np.fromiter(map(itemgetter("profilenumber"), csvDict), dtype = np.int64, count = len(csvDict))
+        flow = np.fromiter(map(itemgetter("flow"), csvDict), dtype = np.float64, count = len(csvDict))
+    first = profile.min()
+    nprofiles = int(profile.max() - first) + 1
+    # Place each flow directly at (node, profile) in a nodes x profiles array, counting how many land in each place
+    cell = node * nprofiles + (profile - first)
+    counts = np.bincount(cell, minlength = len(nodes) * nprofiles).reshape(len(nodes), nprofiles)
+    for problem, bad in [("missing", counts == 0), ("duplicate", counts > 1)]:
+        if bad.any():
+            raise ValueError("Error: %s flows for %s" % (problem, "; ".join(
+                [profileList(nodes[ix], np.flatnonzero(bad[ix]) + first) for ix in np.flatnonzero(bad.any(axis = 1))])))
+    flows = np.empty(len(nodes) * nprofiles, dtype = np.float64)
+    flows[cell] = flow
+    flows = flows.reshape(len(nodes), nprofiles)
+    return {header: flows[ix].tolist() for ix, header in enumerate(headers)}
+
+def csvToFlowData(path, header = True, columns = ["river", "reach", "rs", "profilenumber", "flow"], metrics = None):
+    return makeFlowData(loadFlowColumns(path, header, columns, metrics = metrics), metrics)
+
+class FlowColumns:
+    """
+    Columnar, typed contents of a flow CSV, from loadFlowColumns.
+
+    river, reach and rs are categoricals: array("i") codes into levels[column], the list of distinct values in the
+    order they were first seen.  profilenumber is an array("i") (int32) and flow an array("d") (float64).
+    """
+
+    def __init__(self):
+        self.levels = {col: [] for col in CATEGORY_COLUMNS}
+        self.codes = {col: {} for col in CATEGORY_COLUMNS} # Value -> code, for interning
+        self.river = array("i")
+        self.reach = array("i")
+        self.rs = array("i")
+        self.profilenumber = array("i")
+        self.flow = array("d")
+
+    def __len__(self):
+        return len(self.flow)
+
+    def value(self, col, ix):
+        # Value of a column in row ix, with categoricals decoded to their strings
+        values = getattr(self, col)
+        return self.levels[col][values[ix]] if col in CATEGORY_COLUMNS else values[ix]
+
+    def addColumns(self, data, rows):
+        # Convert and append a chunk of rows, given as a list of columns (in FLOW_COLUMNS order) and the rows (as
+        # lists of strings) that they came from
+        for col, values in zip(FLOW_COLUMNS, data):
+            if col in CATEGORY_COLUMNS:
+                codes = self.codes[col]
+                # New values get the next codes, in the order they first appear
+                for v in dict.fromkeys(values):
+                    if v not in codes:
+                        codes[v] = len(codes)
+                        self.levels[col].append(v)
+                getattr(self, col).extend(map(codes.__getitem__, values))
+            else:
+                if "" in values:
+                    raise ValueError("Error: empty entry not allowed in row: %s" % rows()[values.index("")])
+                getattr(self, col).extend(map(int if col == "profilenumber" else float, values))
+
+def splitRows(lines, cols):
+    # Split lines of a CSV chunk into rows, validating the number of columns as parseCSV does
+    # Quoted values are handled by the csv module
+    rows = list(csv.reader(lines)) if '"' in "".join(lines) else [line.rstrip("\r\n").split(",") for line in lines]
+    for row in rows:
+        if len(row) != cols and row != [] and row != [""]:
+            raise ValueError("Error: number of columns is not consistent in row: %s" % row)
+    # Empty rows, just skip them
+    return [row for row in rows if len(row) == cols]
+
+def loadFlowColumns(path, header = True, columns = FLOW_COLUMNS, chunkRows = CHUNK_ROWS, metrics = None):
+    """
+    Load a flow CSV (see the format above) into a FlowColumns, reading and converting it chunkRows lines at a time.
+
+    This is much faster and smaller than parseFlowCSV for large files, and validates the data in the same way: rows
+    with the wrong number of columns are an error unless they are empty (in which case they are skipped), and empty
+    profile numbers or flows are an error.
+
+    If metrics (a RunMetrics; see metrics.py) is given, the "read" and "convert" stages and the bytes and rows read
+    are recorded in it.
+    """
+    result = FlowColumns()
+    with open(path, "r") as f:
+        if header:
+            columns = next(csv.reader([f.readline()]), [])
+        cols = len(columns)
+        missing = [col for col in FLOW_COLUMNS if col not in columns]
+        if missing:
+            raise ValueError("Error: flow CSV is missing columns: %s" % missing)
+        positions = [columns.index(col) for col in FLOW_COLUMNS]
+        while True:
+            with stage(metrics, "read"):
+                lines = list(islice(f, chunkRows))
+            if not lines:
+                break
+            with stage(metrics, "convert"):
+                addLines(result, lines, cols, positions, metrics)
     return result
 
-def csvToFlowData(path, header = True, columns = ["river", "reach", "rs", "profilenumber", "flow"]):
-    return makeFlowData(parseFlowCSV(path, header, columns))
+def addLines(result, lines, cols, positions, metrics):
+    # Convert a chunk of lines of a flow CSV and add them to result (a FlowColumns)
+    lines = [line for line in lines if line != "\n"] # Empty rows, skip them
+    if not lines:
+        return
+    if not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+    text = "".join(lines)
+    count(metrics, "bytesRead", len(text))
+    count(metrics, "rows", len(lines))
+    if '"' not in text and set(map(methodcaller("count", ","), lines)) == {cols - 1}:
+        # Fast path: every line has the right number of columns, so split the whole chunk at once and take each
+        # column as a slice
+        values = text[:-1].replace("\n", ",").split(",")
+        result.addColumns([values[pos::cols] for pos in positions], lambda: [line[:-1].split(",") for line in lines])
+    else:
+        rows = splitRows(lines, cols)
+        if rows:
+            result.addColumns([[row[pos] for row in rows] for pos in positions], lambda: rows)
@@ -0,0 +1,258 @@
+"""
+This component of the program reads HEC-RAS steady flow files (.fxx), in the format documented in profileWriter, so
+that existing flow files can be inspected, compared, and changed without regenerating them.
+
+A parsed FlowFile holds:
+    * title, version, nprofiles, profileNames: from the file header
+    * flows: {flow header: array of flows}, in the same format as the profiledata argument of buildFile
+    * boundaries: {"river,reach": [boundary data lines for each profile]}, keyed as for the bounddata argument of
+        buildFile
+    * end: the rest of the file after the boundary conditions
+
+After changing flows or boundaries in place, saveFlowFile rewrites only the flow blocks and boundary sections which
+changed.  If every rewritten section is the same length as the original (e.g. changed flows which still fit in the
+8-character columns), the file is patched in place; otherwise it is rewritten with the unchanged sections copied
+over as they were.  Unchanged sections are never reformatted, so a file written by HEC-RAS keeps its formatting.
+Every rewritten section is formatted and checked before the file is touched: a flow too large for its 8-character
+column (7 or more digits before the decimal point, with one after it) is an error, and the file is left as it was.
+
+diffFlowFiles compares two flow files.
+"""
+
+from array import array
+import locale
+import os
+from profileWriter import mkFlowData, mkBoundaryHeader, FLOWS_PER_ROW
+
+FLOW_WIDTH = 8
+
+class FlowFile:
+    """
+    A parsed steady flow file; see the module documentation.
+
+    Section positions in the original file are kept so that saveFlowFile can rewrite only what has changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.title = ""
+        self.version = ""
+        self.nprofiles = 0
+        self.profileNames = []
+        self.flows = {}
+        self.boundaries = {}
+        self.end = ""
+        # Byte spans of each flow block ({header: (start, end)}) and boundary section ({(key, profile): (start, end)})
+        self.flowSpans = {}
+        self.boundarySpans = {}
+        # Values as last read or saved, to find what has changed
+        self.savedFlows = {}
+        self.savedBoundaries = {}
+        self.newline = "\n"
+
+    def profiledata(self):
+        # Flows in the format of buildFile's profiledata
+        return {header: list(flows) for header, flows in self.flows.items()}
+
+    def bounddata(self):
+        # Boundary conditions in the format of buildFile's bounddata, returning the stored lines for each profile
+        return {key: (lambda pn, flow, lines = lines: lines[pn - 1]) for key, lines in self.boundaries.items()}
+
+    def changedFlows(self):
+        return [header for header, flows in self.flows.items() if flows != self.savedFlows.get(header)]
+
+    def changedBoundaries(self):
+        changed = []
+        for key, lines in self.boundaries.items():
+            saved = self.savedBoundaries.get(key, [])
+            changed += [(key, pn + 1) for pn in range(0, len(lines)) if pn >= len(saved) or lines[pn] != saved[pn]]
+        return changed
+
+def readLines(data):
+    # Lines of a file's bytes as (text, start, end) byte spans, where end includes the newline
+    lines = []
+    start = 0
+    encoding = locale.getpreferredencoding(False)
+    while start < len(data):
+        nl = data.find(b"\n", start)
+        end = len(data) if nl == -1 else nl + 1
+        lines.append((data[start:end].decode(encoding).rstrip("\r\n"), start, end))
+        start = end
+    return lines
+
+def parseFlowRow(row):
+    # Flows in one row of a flow block; values are right-aligned in 8-character columns
+    cells = [row[ix:ix + FLOW_WIDTH] for ix in range(0, len(row), FLOW_WIDTH)]
+    return [float(cell) for cell in cells if cell.strip()]
+
+def boundaryKey(line):
+    # ("river,reach", profile) from a boundary header line
+    spec = line.split("=", 1)[1].split(",")
+    return ",".join([spec[0], spec[1].strip()]), int(spec[2])
+
+def parseFlowFile(path):
+    # Parse a steady flow file into a FlowFile
+    with open(path, "rb") as f:
+        data = f.read()
+    ff = FlowFile(path)
+    if b"\r\n" in data:
+        ff.newline = "\r\n"
+    lines = readLines(data)
+    ix = 0
+    # Header
+    while ix < len(lines) and not lines[ix][0].startswith("River Rch & RM="):
+        key, _, value = lines[ix][0].partition("=")
+        if key == "Flow Title":
+            ff.title = value
+        elif key == "Program Version":
+            ff.version = value
+        elif key == "Number of Profiles":
+            ff.nprofiles = int(value)
+        elif key == "Profile Names":
+            ff.profileNames = value.split(",")
+        ix += 1
+    # Flow blocks: a header and rows of flows until the next line with an =
+    while ix < len(lines) and lines[ix][0].startswith("River Rch & RM="):
+        header, start, end = lines[ix]
+        flows = array("d")
+        ix += 1
+        while ix < len(lines) and "=" not in lines[ix][0]:
+            flows.extend(parseFlowRow(lines[ix][0]))
+            end = lines[ix][2]
+            ix += 1
+        ff.flows[header] = flows
+        ff.flowSpans[header] = (start, end)
+    # Boundary sections: a header and the Up/Dn lines after it
+    while ix < len(lines) and lines[ix][0].startswith("Boundary for River Rch & Prof#="):
+        key, profile = boundaryKey(lines[ix][0])
+        start, end = lines[ix][1:]
+        bdata = []
+        ix += 1
+        while ix < len(lines) and (lines[ix][0].startswith("Up ") or lines[ix][0].startswith("Dn ")):
+            bdata.append(lines[ix][0])
+            end = lines[ix][2]
+            ix += 1
+        pnums = ff.boundaries.setdefault(key, [])
+        if profile != len(pnums) + 1:
+            raise ValueError("Error: boundary conditions for %s are out of order at profile %d" % (key, profile))
+        pnums.append(bdata)
+        ff.boundarySpans[(key, profile)] = (start, end)
+    ff.end = ff.newline.join([line[0] for line in lines[ix:]])
+    ff.savedFlows = {header: array("d", flows) for header, flows in ff.flows.items()}
+    ff.savedBoundaries = {key: [list(bdata) for bdata in lines] for key, lines in ff.boundaries.items()}
+    return ff
+
+def checkFlowRows(header, rows, nflows):
+    # Raise if formatted flow rows don't keep to the 8-character columns parseFlowRow reads them in
+    for ix, row in enumerate(rows):
+        ncells = min(nflows - ix * FLOWS_PER_ROW, FLOWS_PER_ROW)
+        if len(row) != ncells * FLOW_WIDTH:
+            raise ValueError("Error: flows in row %d of %s don't fit in %d-character columns: %s" %
+                             (ix + 1, header, FLOW_WIDTH, row))
+
+def sectionText(ff, section, trailingNewline):
+    # New text of a changed flow block (section is a header) or boundary section (section is (key, profile))
+    if isinstance(section, tuple):
+        key, profile = section
+        river, reach = key.split(",", 1)
+        lines = [mkBoundaryHeader(river, reach, profile)] + ff.boundaries[key][profile - 1]
+    else:
+        rows = mkFlowData(ff.flows[section])
+        checkFlowRows(section, rows, len(ff.flows[section]))
+        lines = [section] + rows
+    return ff.newline.join(lines) + (ff.newline if trailingNewline else "")
+
+def saveFlowFile(ff, path = None):
+    """
+    Write the changes made to a FlowFile's flows and boundaries.  Only changed sections are rewritten; see the
+    module documentation.  Changes to the header, the set of reaches or the number of profiles are not supported
+    here; use buildFile with ff.profiledata() and ff.bounddata() to write such a file from scratch.
+
+    :param path: where to write the file; defaults to the file it was read from
+    :return: the number of sections rewritten
+    """
+    if path is None:
+        path = ff.path
+    for header, flows in ff.flows.items():
+        if header not in ff.flowSpans or len(flows) != len(ff.savedFlows[header]):
+            raise ValueError("Error: reaches or profile counts have changed; rewrite the file with buildFile")
+    changed = ff.changedFlows()
+    for key, profile in ff.changedBoundaries():
+        if (key, profile) not in ff.boundarySpans:
+            raise ValueError("Error: reaches or profile counts have changed; rewrite the file with buildFile")
+        changed.append((key, profile))
+    spans = {}
+    for section in changed:
+        spans[section] = (ff.flowSpans if isinstance(section, str) else ff.boundarySpans)[section]
+    encoding = locale.getpreferredencoding(False)
+    # All of the new text is built (and checked) before anything is written
+    with open(ff.path, "rb") as f:
+        patches = []
+        for section in changed:
+            start, end = spans[section]
+            f.seek(end - 1)
+            trailing = f.read(1) == b"\n"
+            patches.append((start, end, sectionText(ff, section, trailing).encode(encoding)))
+    patches.sort()
+    if path == ff.path and all(len(text) == end - start for start, end, text in patches):
+        # Same length: patch the file in place
+        with open(path, "r+b") as f:
+            for start, _, text in patches:
+                f.seek(start)
+                f.write(text)
+    else:
+        # Copy the unchanged parts of the original around the rewritten sections
+        tmp = path + ".tmp"
+        with open(ff.path, "rb") as src, open(tmp, "wb") as dst:
+            pos = 0
+            for start, end, text in patches:
+                dst.write(src.read(start - pos))
+                dst.write(text)
+                src.seek(end)
+                pos = end
+            for block in iter(lambda: src.read(1 << 20), b""):
+                dst.write(block)
+        os.replace(tmp, path)
+    # Section positions may have moved, so re-read them from the new file
+    saved = parseFlowFile(path)
+    ff.path = path
+    ff.flowSpans = saved.flowSpans
+    ff.boundarySpans = saved.boundarySpans
+    ff.savedFlows = saved.savedFlows
+    ff.savedBoundaries = saved.savedBoundaries
+    return len(patches)
+
+def diffFlowFiles(a, b):
+    """
+    Differences between two FlowFiles (or flow file paths), as a list of tuples:
+        ("header", name, a value, b value) for the title, version and number of profiles
+        ("flow", flow header, profile, a flow, b flow) for changed flows, with profile None and the whole list of flows
+            (or None) if a reach is only in one file
+        ("boundary", "river,reach", profile, a lines, b lines) for changed boundary conditions
+    Profiles are numbered from 1.
+    """
+    if isinstance(a, str):
+        a = parseFlowFile(a)
+    if isinstance(b, str):
+        b = parseFlowFile(b)
+    diffs = []
+    for name in ["title", "version", "nprofiles"]:
+        if getattr(a, name) != getattr(b, name):
+            diffs.append(("header", name, getattr(a, name), getattr(b, name)))
+    for header in list(a.flows) + [h for h in b.flows if h not in a.flows]:
+        fa = a.flows.get(header)
+        fb = b.flows.get(header)
+        if fa is None or fb is None or len(fa) != len(fb):
+            diffs.append(("flow", header, None, None if fa is None else list(fa), None if fb is None else list(fb)))
+        elif fa != fb:
+            # Arrays compare in C, so identical reaches cost almost nothing; only differing ones are scanned
+            diffs += [("flow", header, ix + 1, x, y) for ix, (x, y) in enumerate(zip(fa, fb)) if x != y]
+    for key in list(a.boundaries) + [k for k in b.boundaries if k not in a.boundaries]:
+        la = a.boundaries.get(key, [])
+        lb = b.boundaries.get(key, [])
+        for pn in range(0, max(len(la), len(lb))):
+            x = la[pn] if pn < len(la) else None
+            y = lb[pn] if pn < len(lb) else None
+            if x != y:
+                diffs.append(("boundary", key, pn + 1, x, y))
+    return diffs
@@ -0,0 +1,136 @@
+"""
+This component of the program splits a large set of flow profiles (e.g. a full-factorial design from
+generatePermutedFlows) across several flow files, each small enough to run as a single HEC-RAS plan, and stitches
+the resulting reports back together.
+
+writeShards splits the flow data into shards of at most maxProfiles profiles, writes each shard as its own flow file,
+and produces a manifest recording which file and local profile ("PF n") each global scenario ended up
+in.  Scenarios are numbered from 1, in the order of the original flow lists, so scenario i is profile i of the
+unsharded file.  Boundary data functions are called with the global scenario number, so they behave as they would
+for the unsharded file.
+
+Formatting a flow file is pure Python, so the shards are written in parallel processes.  That needs the boundary data
+functions to be picklable, i.e. defined at the top level of a module (like mkRegBound in main.py); if any of them
+isn't (e.g. a lambda or closure), the shards are written one at a time in this process instead.
+
+Once HEC-RAS has been run on each shard, stitchReports parses the per-shard reports and renumbers their profiles by
+global scenario, giving the same format as parseFile for the unsharded file.
+
+Manifest format (saved as JSON):
+{
+    "nprofiles": total number of scenarios,
+    "shards": [{"path": flow file, "title": flow title, "start": first scenario, "nprofiles": profiles in shard}],
+    "scenarios": [[scenario, flow file, "PF n"], ...]
+}
+"""
+
+import json
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from profileWriter import writeFile, FILE_END
+from reportReader import parseReport, profileKeys
+
+def shardRanges(nprofiles, maxProfiles):
+    # (start, stop) ranges of 0-based profile indices for each shard
+    return [(start, min(start + maxProfiles, nprofiles)) for start in range(0, nprofiles, maxProfiles)]
+
+class OffsetBoundary:
+    """
+    Boundary data function for a shard: called with shard-local profile numbers, passes on global ones.  It is a class
+    rather than a closure so that it can be pickled (if bound can) and sent to another process.
+    """
+
+    def __init__(self, bound, offset):
+        self.bound = bound
+        self.offset = offset
+        if hasattr(bound, "boundaryType"):
+            self.boundaryType = bound.boundaryType
+
+    def __call__(self, pn, flow):
+        return self.bound(pn + self.offset, flow)
+
+def picklable(value):
+    try:
+        pickle.dumps(value)
+        return True
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+
+def writeShard(args):
+    path, nprofiles, profiledata, bounddata, title, ver, end = args
+    with open(path, "w") as f:
+        writeFile(f, nprofiles, profiledata, bounddata, title, ver, end)
+
+def writeShards(nprofiles, profiledata, bounddata, pathTemplate, maxProfiles, title="Flow 01", ver="5.0.7",
+                end=FILE_END, manifestPath=None, workers=None):
+    """
+    Write flow data as several flow files of at most maxProfiles profiles each.
+
+    :param nprofiles, profiledata, bounddata, title, ver, end: as for buildFile
+    :param pathTemplate: flow file path with a %d for the (1-based) shard number, e.g. "FullModel.f%02d"
+    :param maxProfiles: maximum number of profiles per flow file
+    :param manifestPath: where to save the manifest as JSON; not saved if None
+    :param workers: number of processes writing files; defaults to the number of CPUs.  With 1, or if the boundary
+                    data functions can't be pickled, the files are written in this process.
+    :return: the manifest
+    """
+    for pheader in profiledata.keys():
+        if len(profiledata[pheader]) != nprofiles:
+            raise ValueError("Number of flow profiles given does not match specified profile count!")
+    ranges = shardRanges(nprofiles, maxProfiles)
+    shards = []
+    jobs = []
+    for ix, (start, stop) in enumerate(ranges):
+        path = pathTemplate % (ix + 1)
+        shardTitle = title if len(ranges) == 1 else "%s %d-%d" % (title, start + 1, stop)
+        shards.append({"path": path, "title": shardTitle, "start": start + 1, "nprofiles": stop - start})
+        shardData = {pheader: list(flows[start:stop]) for pheader, flows in profiledata.items()}
+        shardBounds = {key: OffsetBoundary(bound, start) for key, bound in bounddata.items()}
+        jobs.append((path, stop - start, shardData, shardBounds, shardTitle, ver, end))
+    if workers == 1 or len(jobs) < 2 or not picklable(bounddata):
+        for job in jobs:
+            writeShard(job)
+    else:
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            list(executor.map(writeShard, jobs))
+    manifest = {
+        "nprofiles": nprofiles,
+        "shards": shards,
+        "scenarios": [[shard["start"] + pn, shard["path"], "PF %d" % (pn + 1)]
+                      for shard in shards for pn in range(0, shard["nprofiles"])]
+    }
+    if manifestPath is not None:
+        with open(manifestPath, "w") as f:
+            json.dump(manifest, f)
+    return manifest
+
+def loadManifest(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+def stitchReports(manifest, reports, nodes = None, entryList = None):
+    """
+    Parse the reports of each shard and combine them, with profiles renumbered by global scenario.
+
+    :param manifest: the manifest from writeShards, or the path it was saved to
+    :param reports: the report path for each shard, either as a list in shard order or as {flow file path: report}
+    :param nodes, entryList: as for parseFile
+    :return: the same format as parseFile, with profile keys being global scenario numbers (as strings)
+    """
+    if isinstance(manifest, str):
+        manifest = loadManifest(manifest)
+    if isinstance(reports, dict):
+        reports = [reports[shard["path"]] for shard in manifest["shards"]]
+    if len(reports) != len(manifest["shards"]):
+        raise ValueError("Error: expected %d reports, one per shard" % len(manifest["shards"]))
+    scenarios = {(path, pf): scenario for scenario, path, pf in manifest["scenarios"]}
+    data = {}
+    for shard, report in zip(manifest["shards"], reports):
+        for key, xsData in parseReport(report, nodes, entryList).items():
+            stitched = data.setdefault(key, {"river": xsData["river"], "reach": xsData["reach"], "rs": xsData["rs"]})
+            for pf in profileKeys(xsData):
+                scenario = scenarios.get((shard["path"], "PF " + pf))
+                if scenario is None:
+                    raise ValueError("Error: profile PF %s of %s is not in the manifest" % (pf, report))
+                stitched[str(scenario)] = xsData[pf]
+    return data
@@ -2,6 +2,7 @@ from profileWriter import *
 from reportReader import *
 from utils import *
 from csvReader import *
+from batchReader import batchConvert
 import sys
 
 # Entries to look for
@@ -154,9 +155,11 @@ for node in flowNodes:
     "River Rch & RM=Upper LA River,RH to CC        ,63900.3*": downstreamFlows[0]
 }"""
 
+@constantBoundary
 def mkRegBound(pn, flow):
     return mkBoundaryData("Junction", "Junction", "", "")
 
+@constantBoundary
 def mkBottomBound(pn, flow):
     return mkBoundaryData("Junction", "Normal Depth", "", "0.001")
     # F319 seems to always be around 1.3-1.5 ft deep
@@ -177,11 +180,12 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         which = sys.argv[1]
     else:
-        print("Generate: -g; parse: -p; make CSV: -m; generate from CSV: -gr")
+        print("Generate: -g; parse: -p; make CSV: -m; generate from CSV: -gr; batch parse: -b <reports> <output CSV>")
     generate = which == "-g" or which == "-gr"
     parse = which == "-p"
     makeCSV = which == "-m"
     readCSV = which == "-gr"
+    batch = which == "-b"
     if generate:
         if readCSV:
             text = buildFile(88, csvToFlowData("Z:\\adit\\Desktop\\LARFlows\\code\pyRasFile\\empiricalFlows.csv"), bounds, title="Empirical Flows 2-88")
@@ -190,6 +194,12 @@ if __name__ == "__main__":
             f.write(text)
     if parse:
         convertCSV(NODES, entries = ENTRIES, inpath = PATH, outpath = OUTPATH, selective = False, swmm = True)
+    if batch:
+        # Reports are a glob pattern or a directory of .rep files
+        if len(sys.argv) >= 4:
+            batchConvert(sys.argv[2], NODES, ENTRIES, sys.argv[3])
+        else:
+            print("Usage: python main.py -b <reports> <output CSV>")
     if makeCSV:
         flows = [1, 10, 100, 1000, 10000]
         nodes = [
@@ -0,0 +1,115 @@
+"""
+This component of the program collects opt-in run metrics from the report reader, profile writer and CSV reader, to
+find out where the time goes in a slow conversion.
+
+Pass a RunMetrics as the metrics argument of parseFile, parseReport, convertCSV, writeCSV, buildCSV, writeFile,
+buildFile, loadFlowColumns, makeFlowData or csvToFlowData; without one (the default), nothing is recorded.  Afterwards:
+    * stages: {stage: seconds} of wall time.  Stages can be nested (e.g. "read" happens within "split" while
+        streaming a report); each stage's time excludes the stages nested in it, so the times add up to the total.
+        Report stages are "read" (file I/O), "split" (splitting off cross sections), "parse" (node data and profiles),
+        "entries" (tokenizing entries), "csv" (assembling CSV rows) and "write", plus "cache" and "parallel" when
+        those are used.  The profile writer has "flows" and "boundaries", and the flow CSV reader "read",
+        "convert" and "placement".
+    * counts: {counter: n} of "bytesRead", "bytesWritten" (characters, for text files), "crossSections", "profiles",
+        "rows" and "skippedCrossSections" (cross sections not among the requested nodes)
+    * missingNodes: keys of requested nodes which were not in the report
+
+toDict and toJSON give all of these in one structure, e.g. for batch jobs to log and compare.
+
+Example:
+    metrics = RunMetrics()
+    convertCSV(NODES, ENTRIES, PATH, OUTPATH, metrics = metrics)
+    metrics.toJSON("metrics.json")
+"""
+
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+class RunMetrics:
+    """
+    Stage times and counters for a run; see the module documentation.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+        self.missingNodes = []
+        # [stage, time spent in stages nested in it] for each stage currently running
+        self.running = []
+
+    @contextmanager
+    def stage(self, name):
+        # Time the enclosed code as the given stage
+        self.running.append([name, 0.0])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            _, nested = self.running.pop()
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - nested
+            if self.running:
+                self.running[-1][1] += elapsed
+
+    def timedIter(self, name, iterable):
+        # Yield the items of an iterable, timing the production of each one as the given stage
+        items = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+            yield item
+
+    def add(self, counter, n = 1):
+        self.counts[counter] = self.counts.get(counter, 0) + n
+
+    def total(self):
+        return sum(self.stages.values())
+
+    def toDict(self):
+        return {"stages": dict(self.stages), "total": self.total(), "counts": dict(self.counts),
+                "missingNodes": list(self.missingNodes)}
+
+    def toJSON(self, path = None):
+        # The metrics as JSON, also saved to path if it is given
+        text = json.dumps(self.toDict(), indent = 2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+class MeteredFile:
+    """
+    Wrapper of an open file which records reads and writes in a RunMetrics, as the "read" and "write" stages and the
+    bytesRead and bytesWritten counters.
+    """
+
+    def __init__(self, f, metrics):
+        self.f = f
+        self.metrics = metrics
+
+    def read(self, size = -1):
+        with self.metrics.stage("read"):
+            data = self.f.read(size)
+        self.metrics.add("bytesRead", len(data))
+        return data
+
+    def write(self, data):
+        with self.metrics.stage("write"):
+            self.f.write(data)
+        self.metrics.add("bytesWritten", len(data))
+
+def stage(metrics, name):
+    # metrics.stage(name), or nothing if there are no metrics
+    return nullcontext() if metrics is None else metrics.stage(name)
+
+def count(metrics, counter, n = 1):
+    if metrics is not None:
+        metrics.add(counter, n)
+
+def metered(f, metrics):
+    # f wrapped in a MeteredFile, or f itself if there are no metrics
+    return f if metrics is None else MeteredFile(f, metrics)
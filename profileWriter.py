@@ -78,6 +78,10 @@ Up Type= 0
 Dn Type= 0 
 """
 
+import io
+from functools import lru_cache
+from metrics import stage, count, metered
+
 # I think this is just for unsteady flow, no need for now to support modifications to it
 FILE_END = """DSS Import StartDate=
 DSS Import StartTime=
@@ -88,9 +92,61 @@ DSS Import Interval=
 DSS Import GetPeak= 0 
 DSS Import FillOption= 0"""
 
+def mkBoundaryPrefix(river, reach):
+    # Boundary condition header up to the profile number, which is the same for every profile of a reach
+    return "Boundary for River Rch & Prof#=%s,%s%s, " % (river,reach, " " * (16 - len(reach)))
+
 def mkBoundaryHeader(river, reach, profile):
     # River/reach/profile specification for boundary conditions
-    return "Boundary for River Rch & Prof#=%s,%s%s, %d" % (river,reach, " " * (16 - len(reach)), profile)
+    return mkBoundaryPrefix(river, reach) + "%d" % profile
+
+"""
+Boundary data functions (see buildFile) are called once per profile of each reach unless they are declared
+otherwise, which can save a lot of time for files with many profiles:
+* constantBoundary: the boundary data is the same for every profile and flow, so the function is only called
+    once per reach.
+* flowBoundary: the boundary data depends only on the flow, so the function is called once per distinct flow
+    of each reach.
+Both can be used as decorators, e.g.
+
+@constantBoundary
+def mkRegBound(pn, flow):
+    return mkBoundaryData("Junction", "Junction", "", "")
+"""
+
+CONSTANT_BOUNDARY = "constant"
+FLOW_BOUNDARY = "flow"
+
+def constantBoundary(bound):
+    bound.boundaryType = CONSTANT_BOUNDARY
+    return bound
+
+def flowBoundary(bound):
+    bound.boundaryType = FLOW_BOUNDARY
+    return bound
+
+def boundaryLines(bounddata):
+    # Boundary data lines as the text which follows the boundary header
+    return "".join(["\n" + line for line in bounddata])
+
+def mkBoundaryBlock(river, reach, nprofiles, flows, bound):
+    # Boundary conditions for every profile of a reach, as text, using the declared type of bound (if any) to avoid
+    # recomputing boundary data
+    prefix = "\n" + mkBoundaryPrefix(river, reach)
+    boundType = getattr(bound, "boundaryType", None)
+    if boundType == CONSTANT_BOUNDARY:
+        text = boundaryLines(bound(1, flows[0])) if nprofiles > 0 else ""
+        return "".join([prefix + str(pn) + text for pn in range(1, nprofiles + 1)])
+    if boundType == FLOW_BOUNDARY:
+        cache = {}
+        block = []
+        for pn in range(0, nprofiles):
+            flow = flows[pn]
+            if flow not in cache:
+                cache[flow] = boundaryLines(bound(pn + 1, flow))
+            block.append(prefix + str(pn + 1) + cache[flow])
+        return "".join(block)
+    return "".join([prefix + str(pn + 1) + boundaryLines(bound(pn + 1, flows[pn])) for pn in range(0, nprofiles)])
 
 def mkBoundaryData(upname, dname, uparam="", dparam=""):
     # boundary condition data
@@ -113,19 +169,30 @@ def mkFlowHeader(river, reach, station):
     # River, reach, station specification for flow data
     return "River Rch & RM=%s,%s%s,%s" % (river, reach, " " * (16 - len(reach)), station)
 
+# Flows are written 10 to a row, each right-aligned in 8 characters with one decimal place
+FLOWS_PER_ROW = 10
+FLOW_FORMAT = "%8.1f"
+
+@lru_cache(maxsize=None)
+def flowFormat(nflows):
+    # Format string for a whole flow block of nflows values, one line per row
+    full, rem = divmod(nflows, FLOWS_PER_ROW)
+    rows = [FLOW_FORMAT * FLOWS_PER_ROW] * full + ([FLOW_FORMAT * rem] if rem > 0 else [])
+    return "\n".join(rows)
+
 def mkFlowData(flows):
-    # Flow data
-    flowStrs = ["%5.1f" % flow for flow in flows] # Avoid the strings being too long
-    flowStrs = [" " * (8-len(flow)) + flow for flow in flowStrs]
-    flowRows = []
-    prev = 0
-    for ix in range(1, len(flowStrs)):
-        if ix % 10 == 0:
-            flowRows.append(flowStrs[prev:ix])
-            prev = ix
-    if prev < len(flowStrs) - 1:
-        flowRows.append(flowStrs[prev:])
-    return ["".join(row) for row in flowRows]
+    # Flow data, as a list of rows
+    # The whole block is formatted in a single operation rather than value by value
+    flows = tuple(flows.tolist() if hasattr(flows, "tolist") else flows) # NumPy arrays format faster as lists
+    if len(flows) == 0:
+        return []
+    return (flowFormat(len(flows)) % flows).split("\n")
+
+def mkFlowBlocks(flowMatrix):
+    # Flow data for each row of a 2-D matrix of flows (reaches x profiles, e.g. a NumPy array or a list of lists),
+    # as a list of lists of rows
+    rows = flowMatrix.tolist() if hasattr(flowMatrix, "tolist") else flowMatrix
+    return [mkFlowData(flows) for flows in rows]
 
 def mkHeader(nprofiles, title="Flow 01", ver="5.0.7"):
     # File header - title,version,profile information
@@ -136,32 +203,51 @@ def mkHeader(nprofiles, title="Flow 01", ver="5.0.7"):
         ",".join(["PF %d" % pn for pn in range(1, nprofiles + 1)])
     )
 
-def buildFile(nprofiles, profiledata, bounddata, title="Flow 01", ver="5.0.7", end=FILE_END):
+def writeFile(f, nprofiles, profiledata, bounddata, title="Flow 01", ver="5.0.7", end=FILE_END, metrics=None):
+    """
+    Write a flow file to an open file; see buildFile for the arguments.
+
+    The header, flow data and boundary data are written out as they are produced, so the time taken is linear in the
+    number of reaches and profiles and the file contents are never held in memory.
+
+    If metrics (a RunMetrics; see metrics.py) is given, the "flows" and "boundaries" stages and the profiles and
+    bytes written are recorded in it.
+    """
+    # Check everything up front so that an error doesn't leave a partial file
+    for pheader in profiledata.keys():
+        if len(profiledata[pheader]) != nprofiles:
+            raise ValueError("Number of flow profiles given does not match specified profile count!")
+    f = metered(f, metrics)
+    f.write(mkHeader(nprofiles, title, ver))
+    # Flow data
+    with stage(metrics, "flows"):
+        for pheader in profiledata.keys():
+            f.write("\n" + pheader)
+            for row in mkFlowData(profiledata[pheader]):
+                f.write("\n" + row)
+    # Boundary data
+    with stage(metrics, "boundaries"):
+        for pheader in profiledata.keys():
+            flows = profiledata[pheader]
+            boundspec = pheader.split("=")[1].split(",")[0:2] # This grabs the river and reach
+            boundspec[1] = boundspec[1].strip()
+            f.write(mkBoundaryBlock(boundspec[0], boundspec[1], nprofiles, flows, bounddata[",".join(boundspec)]))
+    f.write("\n" + end)
+    count(metrics, "profiles", nprofiles * len(profiledata))
+
+def buildFile(nprofiles, profiledata, bounddata, title="Flow 01", ver="5.0.7", end=FILE_END, metrics=None):
     """
     profiledata format: a dictionary of the necessary data.
         {flowheader: [flows]}
     bounddata: a dictionary of the necessary boundary condition generators, as functions
         {"River,Reach": function}
             The function accepts the profile number and the flow volume (though it need not use the latter),
-            and returns the appropriate boundary data as a string
-    """
-    header = mkHeader(nprofiles, title, ver)
-    flowdata = []
-    bounds = []
-    # Build flow data and boundary data
-    for pheader in profiledata.keys():
-        flowdata.append(pheader)
-        flows = profiledata[pheader]
-        if len(flows) != nprofiles:
-            raise ValueError("Number of flow profiles given does not match specified profile count!")
-        fd = mkFlowData(flows)
-        flowdata = flowdata + fd
-        boundspec = pheader.split("=")[1].split(",")[0:2] # This grabs the river and reach
-        boundspec[1] = boundspec[1].strip()
-        for pn in range(0, nprofiles):
-            bheader = mkBoundaryHeader(boundspec[0], boundspec[1], pn + 1)
-            bdata = bounddata[",".join(boundspec)](pn + 1, flows[pn])
-            bounds.append(bheader)
-            bounds = bounds + bdata
-    return "\n".join([header] + flowdata + bounds + [end])
+            and returns the appropriate boundary data as a list of lines (e.g. from mkBoundaryData)
+            Functions declared with constantBoundary or flowBoundary are called less often; see above.
+    metrics: optional RunMetrics; see writeFile.
 
+    Returns the file contents as a string; writeFile writes them straight to a file instead.
+    """
+    output = io.StringIO()
+    writeFile(output, nprofiles, profiledata, bounddata, title, ver, end, metrics)
+    return output.getvalue()
@@ -0,0 +1,145 @@
+"""
+This component of the program keeps an on-disk cache of parsed report data, so that re-running an extraction against
+an unchanged report loads the previous result instead of parsing the report again.
+
+Cached results are stored in a cache directory as compressed pickles, named by a hash of the report's content and
+the parsing options (nodes and entries) used, and CACHE_VERSION.  To avoid re-hashing large reports on every run, the directory also
+keeps a manifest of each report's size, modification time and content hash; the content is only hashed again if the
+size or modification time changes.  When the cached results grow past a size limit, the least recently used are
+deleted.
+
+CACHE_VERSION must be bumped whenever a change to the parser changes its output (or the classes of the objects in it),
+so that results parsed by the old code are no longer found.  Results which can't be loaded, e.g. pickles of classes
+which have since been renamed, count as misses.
+
+reportReader uses the cache transparently when given a cache directory, or when the PYRASFILE_CACHE environment
+variable names one.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import pickle
+
+# Default cache directory, used by reportReader when no cache is specified; None disables caching
+CACHE_DIR = os.environ.get("PYRASFILE_CACHE")
+# Total size of cached results to keep, in bytes
+MAX_CACHE_BYTES = 1 << 30
+# Version of the parsed output; part of every result key
+CACHE_VERSION = 1
+MANIFEST = "manifest.json"
+SUFFIX = ".pkl.gz"
+
+def cacheDir(cache):
+    # Resolve the cache argument of the reportReader functions: a directory, None for the default, or False for none
+    # The directory is created if it doesn't exist yet
+    directory = CACHE_DIR if cache is None else (None if cache is False else cache)
+    if directory is not None:
+        os.makedirs(directory, exist_ok = True)
+    return directory
+
+def textHash(text):
+    # Hashed in pieces to avoid an encoded copy of the whole text
+    h = hashlib.sha1()
+    for start in range(0, len(text), 1 << 20):
+        h.update(text[start:start + (1 << 20)].encode("utf-8"))
+    return h.hexdigest()
+
+def contentHash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def writeAtomic(path, data):
+    # Write through a temporary file so that a concurrent reader never sees a partial file
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def loadManifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def fileHash(path, directory):
+    # Content hash of a report, reusing the one in the manifest if the report's size and mtime haven't changed
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    manifest = loadManifest(directory)
+    known = manifest.get(key)
+    if known is not None and known["size"] == st.st_size and known["mtime"] == st.st_mtime_ns:
+        return known["hash"]
+    digest = contentHash(path)
+    manifest[key] = {"size": st.st_size, "mtime": st.st_mtime_ns, "hash": digest}
+    writeAtomic(os.path.join(directory, MANIFEST), json.dumps(manifest).encode("utf-8"))
+    return digest
+
+def resultKey(digest, nodes, entryList, engine = "split", compact = False):
+    # Cache key for a report with the given content hash, parsed with the given node keys, entries, engine and record
+    # format
+    options = repr((CACHE_VERSION, None if nodes is None else sorted(nodes),
+                    None if entryList is None else list(entryList)))
+    if engine != "split":
+        options += engine
+    if compact:
+        options += "compact"
+    return hashlib.sha1((digest + options).encode("utf-8")).hexdigest()
+
+def loadResult(directory, key):
+    # Cached result, or None if there isn't one; a hit counts as a use for eviction
+    path = os.path.join(directory, key + SUFFIX)
+    try:
+        with gzip.open(path, "rb") as f:
+            data = pickle.load(f)
+    except Exception:
+        # Unreadable, truncated, or pickled from classes which no longer exist (ImportError, AttributeError, ...)
+        return None
+    os.utime(path)
+    return data
+
+def storeResult(directory, key, data, maxBytes = None):
+    writeAtomic(os.path.join(directory, key + SUFFIX),
+                gzip.compress(pickle.dumps(data, pickle.HIGHEST_PROTOCOL), compresslevel = 1))
+    evict(directory, MAX_CACHE_BYTES if maxBytes is None else maxBytes)
+
+def evict(directory, maxBytes):
+    # Delete the least recently used results until the cache is no larger than maxBytes
+    results = []
+    for name in os.listdir(directory):
+        if name.endswith(SUFFIX):
+            st = os.stat(os.path.join(directory, name))
+            results.append((st.st_mtime, st.st_size, name))
+    total = sum(size for _, size, _ in results)
+    for _, size, name in sorted(results):
+        if total <= maxBytes:
+            break
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+        total -= size
+
+def cachedParse(directory, digest, nodes, entryList, parse, engine = "split", compact = False):
+    """
+    Load a parse result from the cache, or compute and store it.
+
+    :param directory: the cache directory, from cacheDir
+    :param digest: content hash of the report (from fileHash or textHash)
+    :param nodes: node keys the report is parsed for, or None
+    :param entryList: entries the report is parsed for, or None
+    :param parse: a function of no arguments which parses the report
+    :param engine: the engine the report is parsed with
+    :param compact: whether the profiles are parsed to ProfileRecords
+    """
+    key = resultKey(digest, nodes, entryList, engine, compact)
+    data = loadResult(directory, key)
+    if data is None:
+        data = parse()
+        storeResult(directory, key, data)
+    return data
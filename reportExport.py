@@ -0,0 +1,145 @@
+"""
+This component of the program exports report data in compact, typed, columnar formats as an alternative to the CSV
+written by convertCSV, for consumers (e.g. R or pandas) which would otherwise spend most of their time re-parsing
+the CSV.
+
+Each row is one profile at one node, as in the CSV.  Entries are stored as float64 columns (NaN where missing or not
+a number), the profile number as an int32 column, and river, reach, rs and SWMM node as categorical columns, i.e.
+int32 codes into a list of the distinct values.
+
+Supported formats, chosen by the output file extension:
+    * .npz: NumPy archive, with arrays river, reach, rs and swmm (codes), river_levels etc. (the values the codes
+        refer to), profile, entries (the entry names), and values, of shape (entries, rows), so that values[k] is the
+        column for entries[k].  The typed columns are built up in memory before the archive is written.
+    * .parquet: Parquet, with dictionary-encoded categorical columns; written in row groups as the report is read.
+    * .feather/.arrow: Feather (Arrow IPC file), as for Parquet.
+
+Parquet and Feather require pyarrow; all formats require NumPy.
+"""
+
+from array import array
+import os
+import numpy as np
+from reportReader import iterParseFile, swmmLookup, nodeKeys, profileKeys
+from reportTable import toFloat
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+CATEGORIES = ["river", "reach", "rs", "swmm"]
+# Rows per Parquet row group or Feather record batch
+ROW_GROUP_SIZE = 65536
+
+def exportRows(inpath, nodes, entries):
+    # Rows of (river, reach, rs, swmm, profile, [values]) from a report, in file order, streaming the report
+    # Nodes which are not in the report are reported, as getDataForNodes does
+    swmmNodes = {} if nodes is None else swmmLookup(nodes)
+    found = set()
+    for xsData in iterParseFile(inpath, nodes, entries):
+        node = (xsData["river"], xsData["reach"], xsData["rs"])
+        found.add(" ".join(node))
+        swmm = swmmNodes.get(node, "")
+        for pf in profileKeys(xsData):
+            pfData = xsData[pf]
+            yield node + (swmm, int(pf), [toFloat(pfData[entry]) if entry in pfData else np.nan for entry in entries])
+    for key in [key for key in nodeKeys(nodes or []) if key not in found]:
+        print("Warning: node %s not found in report data--skipping." % key)
+
+def rowGroups(rows, size):
+    # Group an iterable of rows into lists of at most size rows
+    group = []
+    for row in rows:
+        group.append(row)
+        if len(group) == size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+def encode(levels, value):
+    # Code of a categorical value, adding it to the levels ({value: code}) if it is new
+    code = levels.get(value)
+    if code is None:
+        code = levels[value] = len(levels)
+    return code
+
+def writeNpz(inpath, outpath, nodes, entries):
+    levels = {cat: {} for cat in CATEGORIES}
+    codes = {cat: array("i") for cat in CATEGORIES}
+    profile = array("i")
+    columns = [array("d") for _ in entries]
+    for row in exportRows(inpath, nodes, entries):
+        for ix, cat in enumerate(CATEGORIES):
+            codes[cat].append(encode(levels[cat], row[ix]))
+        profile.append(row[4])
+        for column, value in zip(columns, row[5]):
+            column.append(value)
+    arrays = {}
+    for cat in CATEGORIES:
+        arrays[cat] = np.frombuffer(codes[cat], dtype = np.intc).astype(np.int32)
+        arrays[cat + "_levels"] = np.array(list(levels[cat]), dtype = str)
+    arrays["profile"] = np.frombuffer(profile, dtype = np.intc).astype(np.int32)
+    arrays["entries"] = np.array(entries, dtype = str)
+    arrays["values"] = np.array([np.frombuffer(column, dtype = np.float64) for column in columns]).reshape(
+        len(entries), len(profile))
+    np.savez_compressed(outpath, **arrays)
+
+def arrowSchema(entries):
+    fields = [pa.field(cat, pa.dictionary(pa.int32(), pa.string())) for cat in CATEGORIES]
+    fields.append(pa.field("profile", pa.int32()))
+    fields += [pa.field(entry, pa.float64()) for entry in entries]
+    return pa.schema(fields)
+
+def arrowBatches(inpath, nodes, entries, schema, rowGroupSize):
+    # Record batches of at most rowGroupSize rows
+    # The categorical dictionaries only ever grow, so each batch's dictionary extends the previous one's
+    levels = {cat: {} for cat in CATEGORIES}
+    for group in rowGroups(exportRows(inpath, nodes, entries), rowGroupSize):
+        columns = []
+        for ix, cat in enumerate(CATEGORIES):
+            indices = pa.array([encode(levels[cat], row[ix]) for row in group], type = pa.int32())
+            columns.append(pa.DictionaryArray.from_arrays(indices, pa.array(list(levels[cat]), type = pa.string())))
+        columns.append(pa.array([row[4] for row in group], type = pa.int32()))
+        for k in range(len(entries)):
+            columns.append(pa.array([row[5][k] for row in group], type = pa.float64()))
+        yield pa.record_batch(columns, schema = schema)
+
+def writeArrow(inpath, outpath, nodes, entries, fmt, rowGroupSize = ROW_GROUP_SIZE):
+    # Write Parquet (fmt = "parquet") or Feather (fmt = "feather") one row group at a time
+    if pa is None:
+        raise ImportError("Parquet and Feather export require pyarrow")
+    schema = arrowSchema(entries)
+    batches = arrowBatches(inpath, nodes, entries, schema, rowGroupSize)
+    if fmt == "parquet":
+        with pq.ParquetWriter(outpath, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    else:
+        # Dictionary deltas allow the categorical dictionaries to grow from one batch to the next
+        options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas = True)
+        with pa.OSFile(outpath, "wb") as sink:
+            with pa.ipc.new_file(sink, schema, options = options) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+
+def exportReport(inpath, outpath, nodes, entries, rowGroupSize = ROW_GROUP_SIZE):
+    """
+    Export the given entries for the given nodes of a report to a columnar file, with the format chosen by the
+    extension of outpath (.npz, .parquet, .feather or .arrow).
+
+    :param nodes: riverNode dictionaries of the nodes to export, or None for all cross sections
+    :param entries: the entries to export, as for convertCSV with selective = True
+    :param rowGroupSize: rows per Parquet row group or Feather record batch
+    """
+    ext = os.path.splitext(outpath)[1].lower()
+    if ext == ".npz":
+        writeNpz(inpath, outpath, nodes, entries)
+    elif ext == ".parquet":
+        writeArrow(inpath, outpath, nodes, entries, "parquet", rowGroupSize)
+    elif ext in [".feather", ".arrow"]:
+        writeArrow(inpath, outpath, nodes, entries, "feather", rowGroupSize)
+    else:
+        raise ValueError("Error: unsupported export format: %s" % ext)
@@ -0,0 +1,117 @@
+"""
+This component of the program reads HEC-RAS Report (.rep) files while HEC-RAS is still writing them, so that
+downstream processing can start before the model finishes.
+
+A ReportFollower remembers the byte offset just past the last complete cross section it has parsed.  Each poll
+parses only the cross sections appended since then which are complete, i.e. which are followed by the start of
+another cross section.  The last cross section in a report is only complete once the report is finished, so it is
+parsed by a final poll.  The offset can be saved to a checkpoint file after every poll, so that a follower restarted
+with the same checkpoint carries on where the previous one left off.
+
+Example:
+    follower = ReportFollower(PATH, checkpoint = PATH + ".follow", nodes = NODES, entryList = ENTRIES)
+    for xsData in follower.follow(interval = 30, idle = 600):
+        ...
+"""
+
+import hashlib
+import json
+import os
+import time
+from reportReader import splitStream, parseXs, decodeReport, nodeKeys, XS_MARKER
+
+# Bytes at the start of the report which are hashed to tell whether a report has been replaced since a checkpoint
+HEAD_BYTES = 4096
+
+class ReportFollower:
+    """
+    Incremental reader for a report which is still being written.
+
+    :param path: the report path
+    :param checkpoint: path of a JSON file to load the starting offset from and save it to after each poll; optional
+    :param nodes: riverNode dictionaries of the cross sections to parse, as for parseFile
+    :param entryList: entries to parse, as for parseFile
+    """
+
+    def __init__(self, path, checkpoint = None, nodes = None, entryList = None):
+        self.path = path
+        self.checkpoint = checkpoint
+        self.keys = None if nodes is None else nodeKeys(nodes)
+        self.entryList = entryList
+        self.offset = 0
+        self.head = ""
+        if checkpoint is not None and os.path.exists(checkpoint):
+            with open(checkpoint, "r") as f:
+                saved = json.load(f)
+            if saved["path"] == os.path.abspath(path):
+                self.offset = saved["offset"]
+                self.head = saved["head"]
+
+    def headHash(self, f):
+        f.seek(0)
+        return hashlib.sha1(f.read(min(self.offset, HEAD_BYTES))).hexdigest()
+
+    def save(self):
+        if self.checkpoint is None:
+            return
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"path": os.path.abspath(self.path), "offset": self.offset, "head": self.head}, f)
+        os.replace(tmp, self.checkpoint)
+
+    def poll(self, final = False):
+        """
+        Parse the complete cross sections appended since the last poll.
+
+        :param final: whether the report is finished, in which case the last cross section is complete too
+        :return: a list of parsed cross sections, as from parseXs, in file order
+        """
+        if not os.path.exists(self.path):
+            return []
+        parsed = []
+        with open(self.path, "rb") as f:
+            # Start again if the report has been truncated or replaced since the offset was saved
+            f.seek(0, os.SEEK_END)
+            if f.tell() < self.offset or (self.offset > 0 and self.headHash(f) != self.head):
+                self.offset = 0
+            f.seek(self.offset)
+            pending = None
+            for start, piece in splitStream(f, XS_MARKER.encode("ascii")):
+                if pending is not None:
+                    parsed += self.parse(pending)
+                pending = piece
+                # The piece being held back starts here; if it turns out to be incomplete, it is re-read next time
+                resume = self.offset + start
+            if final and pending is not None:
+                parsed += self.parse(pending)
+                resume += len(pending)
+            self.offset = resume
+            self.head = self.headHash(f)
+        self.save()
+        return parsed
+
+    def parse(self, piece):
+        # Parse one complete piece of the report; non-cross-section pieces (e.g. the start of the report) are skipped
+        if b"CROSS SECTION OUTPUT" not in piece:
+            return []
+        xsData = parseXs(decodeReport(piece), self.keys, self.entryList)
+        return [] if xsData is None else [xsData]
+
+    def follow(self, interval = 5.0, idle = 60.0):
+        """
+        Poll the report every interval seconds, yielding cross sections as they are completed.  Once the report has
+        not grown for idle seconds, it is taken to be finished: the last cross section is yielded and this stops.
+        """
+        lastSize = -1
+        lastChange = time.monotonic()
+        while True:
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else -1
+            if size != lastSize:
+                lastSize = size
+                lastChange = time.monotonic()
+            finished = time.monotonic() - lastChange >= idle
+            for xsData in self.poll(final = finished):
+                yield xsData
+            if finished:
+                return
+            time.sleep(interval)
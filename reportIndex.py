@@ -0,0 +1,122 @@
+"""
+This component of the program builds a byte-offset index over HEC-RAS Report (.rep) files, so that selected cross
+sections and profiles can be read and parsed without going through the rest of the report.
+
+The index is built in a single pass over the report and saved next to it (report.rep -> report.rep.idx) as JSON.
+It records, for each cross section, the byte offset and length of the cross-section block and of each profile
+block within it, keyed by (river, reach, rs, profile).  The index also stores the size and modification time of the
+report it was built from and is rebuilt automatically if the report changes.
+
+Offsets point just past the "CROSS SECTION  " and "Profile #PF" markers, so the indexed blocks are exactly the
+pieces which reportReader's crossSections and profiles split the report into.
+"""
+
+import json
+import mmap
+import os
+from reportReader import splitStream, nodeData, entries, parseXs, decodeReport, xsKey, XS_MARKER
+
+PROFILE_MARKER = "Profile #PF"
+INDEX_SUFFIX = ".idx"
+
+def indexPath(path):
+    # Where the index for a given report is stored
+    return path + INDEX_SUFFIX
+
+def reportStamp(path):
+    # Size and modification time of the report, used to tell whether an index is stale
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime_ns}
+
+def profileSpans(block, offset):
+    # Byte spans of the profiles in a cross-section block starting at offset: {profile number: [offset, length]}
+    marker = PROFILE_MARKER.encode("ascii")
+    spans = {}
+    ix = block.find(marker)
+    while ix != -1:
+        start = ix + len(marker)
+        end = block.find(marker, start)
+        stop = len(block) if end == -1 else end
+        # First line has the profile number
+        lineEnd = block.find(b"\n", start, stop)
+        pnum = decodeReport(block[start:stop if lineEnd == -1 else lineEnd]).strip()
+        spans[pnum] = [offset + start, stop - start]
+        ix = end
+    return spans
+
+def buildIndex(path):
+    # Scan the report once, recording where each cross section and profile is
+    sections = []
+    with open(path, "rb") as f:
+        for offset, block in splitStream(f, XS_MARKER.encode("ascii")):
+            if b"CROSS SECTION OUTPUT" not in block:
+                continue
+            node = nodeData(decodeReport(block[:block.find(PROFILE_MARKER.encode("ascii"))]))
+            sections.append({
+                "river": node["river"],
+                "reach": node["reach"],
+                "rs": node["rs"],
+                "offset": offset,
+                "length": len(block),
+                "profiles": profileSpans(block, offset)
+            })
+    index = reportStamp(path)
+    index["sections"] = sections
+    return index
+
+def saveIndex(path, index):
+    with open(indexPath(path), "w") as f:
+        json.dump(index, f)
+
+def loadIndex(path, rebuild = True):
+    # Load the index for a report, building (and saving) it if it is missing or out of date
+    # If rebuild is False, a missing or stale index returns None instead
+    ipath = indexPath(path)
+    if os.path.exists(ipath):
+        with open(ipath, "r") as f:
+            index = json.load(f)
+        stamp = reportStamp(path)
+        if index["size"] == stamp["size"] and index["mtime"] == stamp["mtime"]:
+            return index
+    if not rebuild:
+        return None
+    index = buildIndex(path)
+    saveIndex(path, index)
+    return index
+
+def parseIndexed(path, nodes = None, profiles = None, index = None, entryList = None):
+    """
+    Parse only the requested cross sections and profiles of a report, using its index to read them directly from a
+    memory-mapped file.
+
+    :param nodes: riverNode dictionaries of the cross sections to parse; all cross sections if None
+    :param profiles: profile numbers to parse (e.g. [1, 2] or ["1", "2"]); all profiles if None
+    :param index: a previously loaded index; loaded (or built) with loadIndex if not given
+    :param entryList: entries to extract, as for parseFile; all entries if None
+    :return: the same format as parseFile, restricted to the requested nodes and profiles
+    """
+    if index is None:
+        index = loadIndex(path)
+    sections = {xsKey(section): section for section in index["sections"]}
+    if nodes is not None:
+        keys = set(xsKey(node) for node in nodes)
+        sections = {key: section for key, section in sections.items() if key in keys}
+    wanted = None if profiles is None else [str(pf) for pf in profiles]
+    data = {}
+    if not sections:
+        return data
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+            # Keep file order, as parseFile does
+            for key, section in sorted(sections.items(), key = lambda item: item[1]["offset"]):
+                if wanted is None:
+                    start = section["offset"]
+                    data[key] = parseXs(decodeReport(mm[start:start + section["length"]]), entryList = entryList)
+                    continue
+                xsData = {"river": section["river"], "reach": section["reach"], "rs": section["rs"]}
+                for pf in wanted:
+                    if pf in section["profiles"]:
+                        start, length = section["profiles"][pf]
+                        xsData[pf] = entries(decodeReport(mm[start:start + length]), entryList)
+                data[key] = xsData
+    return data
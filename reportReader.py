@@ -54,6 +54,16 @@ CROSS SECTION OUTPUT  Profile #PF 3
 Warning: The cross-section end points had to be extended vertically for the computed water surface.
 """
 
+import io
+import locale
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from metrics import stage, count, metered
+from reportCache import cacheDir, cachedParse, fileHash, textHash
+from reportRecords import Schema
+from reportWarnings import WarningTable, writeWarningsCSV
+
 def riverNode(river, reach, rs, swmm = ""):
     # This just makes a dict; defining a function purely for convenience
     # swmm = corresponding SWMM node; this is specific to the LARFlows project and can be ignored by other users
@@ -61,20 +71,30 @@ def riverNode(river, reach, rs, swmm = ""):
 
 
 
-def getDataForNodes(xsData, nodes):
+def getDataForNodes(xsData, nodes, metrics = None):
     # Extract the relevant data from the parsed-out data
+    # Missing nodes are also recorded in metrics (a RunMetrics; see metrics.py), if given
     keys = [" ".join([node["river"], node["reach"], node["rs"]]) for node in nodes]
     availKeys = [key for key in keys if key in xsData.keys()]
     entries = [xsData[key] for key in availKeys]
     for key in [key for key in keys if not key in availKeys]:
         print("Warning: node %s not found in report data--skipping." % key)
+        if metrics is not None:
+            metrics.missingNodes.append(key)
     return entries
 
-def makeNodePfDataString(nodeData, pf, riverNode, entries, swmm = False, nodes = []):
+def swmmLookup(nodes):
+    # {(river, reach, rs): SWMM node} for the given nodes; if a node is listed twice, the first one is used
+    lookup = {}
+    for node in nodes:
+        lookup.setdefault((node["river"], node["reach"], node["rs"]), node["swmm"])
+    return lookup
+
+def makeNodePfDataString(nodeData, pf, riverNode, entries, swmm = False, nodes = [], swmmNodes = None):
     # Make a CSV line of the relevant data from the node, for the given profile number
     # In order to not be selective, just set entries to be all of the keys for an arbitrary cross-section;
     # specifying entries is necessary, however, to ensure a consistent order
-    # If swmm, also include the SWMM node
+    # If swmm, also include the SWMM node, looked up in swmmNodes (from swmmLookup) or, if that isn't given, nodes
     outData = [riverNode["river"], riverNode["reach"], riverNode["rs"], pf]
     for entry in entries:
         if entry in nodeData.keys():
@@ -83,52 +103,136 @@ def makeNodePfDataString(nodeData, pf, riverNode, entries, swmm = False, nodes =
             outData.append("")
     # Find what SWMM node it corresponds to, if necessary
     if swmm:
-        found = False
-        for node in nodes:
-            if found:
-                break
-            if node["river"] == riverNode["river"] and node["reach"] == riverNode["reach"] and node["rs"] == riverNode["rs"]:
-                found = True
-                outData.append(node["swmm"])
-        if not found:
-            outData.append("")
-    return ",".join(outData)
+        if swmmNodes is None:
+            swmmNodes = swmmLookup(nodes)
+        outData.append(swmmNodes.get((riverNode["river"], riverNode["reach"], riverNode["rs"]), ""))
+    return ",".join(map(str, outData)) # Values are floats with the fixed engine
 
-def buildCSV(xsData, nodes, entries, selective = False, swmm = False):
-    # Build the CSV file for the relevant nodes and, if selective, relevant entries
+def writeCSV(f, xsData, nodes, entries, selective = False, swmm = False, metrics = None):
+    # Write the CSV for the relevant nodes and, if selective, relevant entries to an open file, one row at a time
     # If not selective, entries will simply be the entries of the first node
     # If swmm, data will also include which swmm node the entry corresponds to
-    entriesSet = selective
-    data = getDataForNodes(xsData, nodes)
-    output = []
+    # metrics is an optional RunMetrics (see metrics.py)
+    with stage(metrics, "csv"):
+        writeRows(metered(f, metrics), getDataForNodes(xsData, nodes, metrics), nodes, entries, selective, swmm,
+                  metrics)
+
+def writeRows(f, data, nodes, entries, selective, swmm, metrics):
+    if not selective:
+        for datum in data:
+            pfs = profileKeys(datum)
+            if pfs:
+                entries = datum[pfs[0]].keys() # To keep a specific order
+                break
+    swmmNodes = swmmLookup(nodes) if swmm else None
+    f.write("River,Reach,RS,Profile," + ",".join(entries) + ",SWMM Node" if swmm else "")
     for datum in data:
-        pfs = [k for k in datum.keys() if not k in ["river", "reach", "rs"]] # PF numbers only
+        pfs = profileKeys(datum)
         for pf in pfs:
-            nodeData = datum[pf]
-            if not entriesSet:
-                entries = nodeData.keys() # To keep a specific order
-                entriesSet = True
-            output.append(makeNodePfDataString(nodeData, pf, datum, entries, swmm, nodes))
-    output = ["River,Reach,RS,Profile," + ",".join(entries) + ",SWMM Node" if swmm else ""] + output
-    return "\n".join(output)
-
-def convertCSV(nodes, entries, inpath, outpath, selective = False, swmm = False):
+            f.write("\n")
+            f.write(makeNodePfDataString(datum[pf], pf, datum, entries, swmm, nodes, swmmNodes))
+        count(metrics, "rows", len(pfs))
+
+def buildCSV(xsData, nodes, entries, selective = False, swmm = False, metrics = None):
+    # Build the CSV file for the relevant nodes and, if selective, relevant entries, as a string
+    # See writeCSV, which is better for large outputs
+    output = io.StringIO()
+    writeCSV(output, xsData, nodes, entries, selective, swmm, metrics)
+    return output.getvalue()
+
+def convertCSV(nodes, entries, inpath, outpath, selective = False, swmm = False, workers = None, cache = None,
+               metrics = None, warningsPath = None, engine = "split", compact = False):
+    # Only the requested nodes (and, if selective, entries) are parsed
+    # If workers is given, the report is parsed in that many processes; see parseReport for cache, metrics, engine and
+    # compact
+    # If warningsPath is given, the warnings for the requested nodes are also written there (see reportWarnings)
+    warnings = None if warningsPath is None else WarningTable()
+    xsData = parseReport(inpath, nodes, entries if selective else None, workers = workers, cache = cache,
+                         metrics = metrics, warnings = warnings, engine = engine, compact = compact)
     with open(outpath, "w") as f:
-        f.write(buildCSV(parseFile(getReportFile(inpath)), nodes, selective = selective, entries = entries, swmm = swmm))
+        writeCSV(f, xsData, nodes, selective = selective, entries = entries, swmm = swmm, metrics = metrics)
+    if warnings is not None:
+        writeWarningsCSV(warnings, warningsPath)
 
 def getReportFile(filename):
     with open(filename, "r") as f:
         return f.read()
 
+def decodeReport(data):
+    # Decode raw report bytes the way getReportFile's text-mode open would (default encoding, universal newlines)
+    text = data.decode(locale.getpreferredencoding(False))
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+# CROSS SECTION on its own shows up a lot, but it's only followed by two blank spaces when it's a new XS
+XS_MARKER = "CROSS SECTION  "
+# Amount of the report read at a time when streaming; a cross section may span any number of reads
+CHUNK_SIZE = 1 << 20
+
 def crossSections(text):
     # Split file content into separate cross sections
-    # CROSS SECTION on its own shows up a lot, but it's only followed by two blank spaces when it's a new XS
-    return text.split("CROSS SECTION  ")
+    return text.split(XS_MARKER)
+
+def iterSplit(text, sep):
+    # Lazy equivalent of text.split(sep)
+    start = 0
+    ix = text.find(sep)
+    while ix != -1:
+        yield text[start:ix]
+        start = ix + len(sep)
+        ix = text.find(sep, start)
+    yield text[start:]
+
+def splitStream(fileobj, sep, chunkSize = CHUNK_SIZE):
+    # Incremental equivalent of fileobj.read().split(sep): yields (offset, piece) pairs, where offset is the
+    # position of the piece in the stream (in characters for text files, bytes for binary files)
+    # Only the current piece and one read are ever held in memory
+    # Pieces are sliced out of the buffer at a moving position, and the buffer is trimmed once per read, so each read
+    # is copied a bounded number of times however many pieces it holds
+    buffer = sep[:0]
+    start = 0 # Offset of buffer[0] in the stream
+    while True:
+        chunk = fileobj.read(chunkSize)
+        if not chunk:
+            break
+        # The separator may straddle two reads, so resume the search just before the end of the old buffer
+        searchFrom = max(len(buffer) - len(sep) + 1, 0)
+        buffer += chunk
+        pos = 0 # Start of the current piece in the buffer
+        ix = buffer.find(sep, searchFrom)
+        while ix != -1:
+            yield start + pos, buffer[pos:ix]
+            pos = ix + len(sep)
+            ix = buffer.find(sep, pos)
+        if pos > 0:
+            buffer = buffer[pos:]
+            start += pos
+    yield start, buffer
+
+def iterCrossSections(fileobj, chunkSize = CHUNK_SIZE):
+    # Streaming equivalent of crossSections, filtered to the actual cross sections as parseFile does
+    # Works on any file-like object opened in text mode (including io.StringIO)
+    for _, xs in splitStream(fileobj, XS_MARKER, chunkSize):
+        if "CROSS SECTION OUTPUT" in xs:
+            yield xs
+
+def headerLines(xs, count):
+    # The first count non-blank lines of a cross section, without splitting up the rest of it
+    lines = []
+    start = 0
+    while len(lines) < count:
+        end = xs.find("\n", start)
+        line = xs[start:] if end == -1 else xs[start:end]
+        if line.strip() != "":
+            lines.append(line)
+        if end == -1:
+            break
+        start = end + 1
+    return lines
 
 def nodeData(xs):
     # Get the node information (river, reach, rs) for a given cross-section
     # Information is on the first two lines after CROSS SECTION
-    lines = [ln for ln in xs.split("\n") if ln.strip() != ""][0:2]
+    lines = headerLines(xs, 2)
     river = " ".join([i for i in lines[0].split(" ") if i != ""][1:])   # The first thing is RIVER:;
                                                                         # the rest is the river name
     ln2dat = [i for i in lines[1].split(" ") if i != ""]
@@ -141,12 +245,27 @@ def profiles(xs):
     # Split a cross section into profiles
     return xs.split("Profile #PF")
 
-def entries(profile):
+# Suffixes given to the Left OB/Channel/Right OB values of the entries after Element
+BANKS = [".LOB", ".MC", ".ROB"]
+
+def rowLabel(entry):
+    # The label of the row an entry is read from, i.e. the entry without any LOB/MC/ROB suffix
+    for bank in BANKS:
+        if entry.endswith(bank):
+            return entry[:-len(bank)]
+    return entry
+
+def entries(profile, entryList = None):
     # Data starts on row 3 and continues through row 17
-    data = profile.split("\n")[2:17]
+    # If entryList is given, only those entries are returned, and rows which can't contain them are never split
+    data = profile.split("\n", 17)[2:17]
+    labels = None if entryList is None else set(rowLabel(entry) for entry in entryList)
     output = {}
     reachedElem = False
     for row in data:
+        if labels is not None and (reachedElem or "Element" not in row) and \
+                not any(label in row for label in labels):
+            continue
         items = [i.strip() for i in row.split("  ") if i != ""] # Separate items are always separated by multiple spaces
         if len(items) >= 4: # Sometimes something seems to be missing from the row
             output[items[0]] = items[1]
@@ -170,26 +289,312 @@ def entries(profile):
                     output[items[2] + ".MC"] = items[3]
             if items[2] == "Element":
                 reachedElem = True
+    if entryList is not None:
+        output = {entry: output[entry] for entry in entryList if entry in output}
+    return output
+
+"""
+Fixed-width engine: rather than splitting rows on spaces and guessing which banks the values belong to, the column
+positions are taken from the header row of the table (the one with "Element  Left OB  Channel  Right OB"), and each
+row is sliced at them:
+    * the left value is right-aligned to the end of the left value in the header row, with its label before it
+    * the right label runs from the start of "Element" to the start of the Left OB column
+    * each bank's values are right-aligned in a column ending at the end of its header, so the Left OB column runs
+        from the end of "Left OB", less the width of the Channel column, to the end of "Left OB", and the Channel and
+        Right OB columns from the end of the previous header to the end of their own
+Values are parsed to floats as they are sliced (anything which isn't a number is kept as a string), and blank banks
+are left out, so which bank a value belongs to never depends on how many values the row has.
+"""
+
+# Bank headers of the output table, in the order of BANKS
+BANK_HEADERS = ["Left OB", "Channel", "Right OB"]
+
+@lru_cache(maxsize = None)
+def bankSpans(headerRight):
+    # (start, end) of each bank column, relative to the start of "Element", from the header row from there on
+    ends = []
+    for bank in BANK_HEADERS:
+        ix = headerRight.find(bank, ends[-1] if ends else 0)
+        if ix == -1:
+            return None
+        ends.append(ix + len(bank))
+    starts = [ends[0] - (ends[1] - ends[0])] + ends[:-1]
+    return tuple(zip(starts, ends))
+
+def tableColumns(header):
+    # (end of the left value, start of the right label, bank spans) for a table header row, or None if it isn't one
+    element = header.find("Element")
+    if element == -1:
+        return None
+    spans = bankSpans(header[element:])
+    if spans is None:
+        return None
+    return len(header[:element].rstrip()), element, tuple((element + a, element + b) for a, b in spans)
+
+# Stripped labels and bank entry names for the raw label text of each row, which is the same in every profile
+ROW_LABELS = {}
+
+def rowKeys(raw):
+    keys = ROW_LABELS.get(raw)
+    if keys is None:
+        label = raw.strip()
+        keys = ROW_LABELS[raw] = (label, tuple(label + bank for bank in BANKS))
+    return keys
+
+def fixedEntries(profile, entryList = None):
+    # Fixed-width equivalent of entries, with values parsed to floats (see above)
+    # If the table has no header row, this falls back on entries
+    data = profile.split("\n", 17)[2:17]
+    columns = tableColumns(data[0]) if data else None
+    if columns is None:
+        return entries(profile, entryList)
+    leftEnd, element, spans = columns
+    (lobStart, lobEnd), (mcStart, mcEnd), (robStart, robEnd) = spans
+    if entryList is not None:
+        labels = set(rowLabel(entry) for entry in entryList)
+        data = data[0:1] + [row for row in data[1:] if any(label in row for label in labels)]
+    output = {}
+    for row in data:
+        # The left value is right-aligned, so if there is one, it ends at leftEnd
+        left = row[:leftEnd].rsplit(None, 1)
+        if len(left) == 2 and row[leftEnd - 1:leftEnd].strip():
+            label = rowKeys(left[0])[0]
+            try:
+                output[label] = float(left[1])
+            except ValueError:
+                output[label] = left[1]
+        label, (lob, mc, rob) = rowKeys(row[element:lobStart])
+        if label == "Element":
+            output[label] = BANK_HEADERS[0] # As for entries
+            continue
+        for key, value in [(lob, row[lobStart:lobEnd]), (mc, row[mcStart:mcEnd]), (rob, row[robStart:robEnd])]:
+            if value and not value.isspace():
+                try:
+                    output[key] = float(value)
+                except ValueError:
+                    output[key] = value.strip()
+    if entryList is not None:
+        output = {entry: output[entry] for entry in entryList if entry in output}
     return output
 
-def parseXs(xs):
+# Tokenizers which can be chosen with the engine argument of parseFile etc.
+ENGINES = {"split": entries, "fixed": fixedEntries}
+
+def nodeKeys(nodes):
+    # Set of parseFile keys for a list of riverNode dictionaries, for use as the nodes argument of parseXs
+    return set(xsKey(node) for node in nodes)
+
+def parseXs(xs, nodes = None, entryList = None, metrics = None, warnings = None, engine = "split", schema = None):
     # Parse the cross-section, returning node data, profile number, and entries
+    # If nodes (a set of keys from nodeKeys) is given, cross sections not in it are skipped, returning None, before
+    # their profiles are split; entryList is passed on to entries
+    # metrics is an optional RunMetrics (see metrics.py), and warnings an optional WarningTable (see reportWarnings)
+    # which the warnings of each profile are added to
+    # engine chooses the tokenizer of the output tables, from ENGINES: "split" (entries) or "fixed" (fixedEntries)
+    # If schema (a reportRecords.Schema) is given, each profile is stored as a ProfileRecord of it
+    tokenize = engineFor(engine)
     data = nodeData(xs)
+    if nodes is not None and xsKey(data) not in nodes:
+        count(metrics, "skippedCrossSections")
+        return None
     profs = profiles(xs)[1:]
     for prof in profs:
-        pnum = prof.split("\n")[0].strip() # First line has the profile number
-        data[pnum] = entries(prof)
+        pnum = prof.split("\n", 1)[0].strip() # First line has the profile number
+        if metrics is None:
+            data[pnum] = tokenize(prof, entryList)
+        else:
+            with metrics.stage("entries"):
+                data[pnum] = tokenize(prof, entryList)
+        if schema is not None:
+            data[pnum] = schema.record(data[pnum])
+        if warnings is not None:
+            warnings.addProfile(data, pnum, prof)
+    count(metrics, "crossSections")
+    count(metrics, "profiles", len(profs))
     return data
 
-def parseFile(text):
-    # Extract cross-section data from file
-    xses = crossSections(text)
-    xses = [xs for xs in xses if "CROSS SECTION OUTPUT" in xs] # Filter out non-cross-section entries at beginning
+def engineFor(engine):
+    if engine not in ENGINES:
+        raise ValueError("Error: unknown engine %s; expected one of %s" % (engine, list(ENGINES)))
+    return ENGINES[engine]
+
+def xsKey(xsData):
+    # Key of a parsed cross section in the output of parseFile; matches the keys used by getDataForNodes
+    return " ".join([xsData["river"], xsData["reach"], xsData["rs"]])
+
+# Keys of a parsed cross section which identify the node rather than being profiles
+NODE_FIELDS = ["river", "reach", "rs"]
+
+def profileKeys(xsData):
+    # Profile numbers of a parsed cross section, in order
+    return [k for k in xsData.keys() if k not in NODE_FIELDS]
+
+def collectXs(xsDatas):
+    # Gather parsed cross sections into the {key: data} format returned by parseFile, dropping skipped ones
+    data = {}
+    for xsData in xsDatas:
+        if xsData is not None:
+            data[xsKey(xsData)] = xsData
+    return data
+
+def parsePieces(pieces, keys, entryList, metrics = None, warnings = None, engine = "split", schema = None):
+    # Parse the cross sections among pieces of a report split at XS_MARKER, skipping those which aren't requested
+    # The splitting itself is timed as the "split" stage
+    if metrics is not None:
+        pieces = metrics.timedIter("split", pieces)
+    for xs in pieces:
+        if "CROSS SECTION OUTPUT" in xs:
+            with stage(metrics, "parse"):
+                xsData = parseXs(xs, keys, entryList, metrics, warnings, engine, schema)
+            if xsData is not None:
+                yield xsData
+
+def iterParseXs(fileobj, nodes = None, entryList = None, metrics = None, warnings = None, engine = "split",
+                compact = False):
+    # Parse cross sections one at a time from an open report; memory is bounded by the largest cross section
+    # nodes, entryList, metrics, warnings, engine and compact are as for parseFile
+    keys = None if nodes is None else nodeKeys(nodes)
+    schema = Schema() if compact else None
+    pieces = (xs for _, xs in splitStream(metered(fileobj, metrics), XS_MARKER))
+    for xsData in parsePieces(pieces, keys, entryList, metrics, warnings, engine, schema):
+        yield xsData
+
+def iterParseFile(path, nodes = None, entryList = None, metrics = None, warnings = None, engine = "split",
+                  compact = False):
+    # Parse cross sections one at a time from a report file without reading the whole file
+    with open(path, "r") as f:
+        for xsData in iterParseXs(f, nodes, entryList, metrics, warnings, engine, compact):
+            yield xsData
+
+# Each worker gets several parts of a report so that a few slow parts don't hold up the rest
+PARTS_PER_WORKER = 4
+
+def textParts(text, parts):
+    # Split text into (at most) the given number of parts, each starting at a cross-section marker
+    bounds = [0]
+    for k in range(1, parts):
+        ix = text.find(XS_MARKER, max(len(text) * k // parts, bounds[-1] + 1))
+        if ix == -1:
+            break
+        if ix > bounds[-1]:
+            bounds.append(ix)
+    bounds.append(len(text))
+    return [text[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+def reportRanges(path, parts):
+    # Split a report file into (at most) the given number of byte ranges, each starting at a cross-section marker
+    marker = XS_MARKER.encode("ascii")
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for k in range(1, parts):
+            pos = max(size * k // parts, bounds[-1] + 1)
+            f.seek(pos)
+            buffer = b""
+            found = -1
+            while found == -1:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                # Keep enough of the previous read to catch a marker split between reads
+                keep = len(buffer) - len(marker) + 1
+                if keep > 0:
+                    pos += keep
+                    buffer = buffer[keep:]
+                buffer += chunk
+                found = buffer.find(marker)
+            if found == -1:
+                break
+            bounds.append(pos + found)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def parseText(args):
+    # Worker for parallel parsing of text: (text, node keys, entryList, collect warnings, engine, compact) ->
+    # (parseFile-format data, WarningTable or None)
+    text, keys, entryList, collect, engine, compact = args
+    warnings = WarningTable() if collect else None
+    schema = Schema() if compact else None
+    pieces = iterSplit(text, XS_MARKER)
+    return collectXs(parsePieces(pieces, keys, entryList, None, warnings, engine, schema)), warnings
+
+def parseRange(args):
+    # Worker for parallel parsing of a report: (path, start, end, node keys, entryList, collect warnings, engine,
+    # compact) -> as for parseText
+    path, start, end, keys, entryList, collect, engine, compact = args
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = decodeReport(f.read(end - start))
+    return parseText((text, keys, entryList, collect, engine, compact))
+
+def parseParallel(worker, jobs, workers, metrics = None, warnings = None):
+    # Run parsing jobs in a process pool and merge their results (and warnings) in file order
+    # Merging in order gives exactly the dictionary (including key order) that serial parsing would
+    # Only the overall time and the totals are recorded in metrics, as the workers are in other processes
     data = {}
-    while len(xses) > 0:
-        xs = xses[0]
-        xsData = parseXs(xs)
-        data[" ".join([xsData["river"], xsData["reach"], xsData["rs"]])] = xsData
-        # Shrink the list as the program goes through it, in order to reduce memory usage
-        xses = xses[1:]
+    with stage(metrics, "parallel"):
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            for part, partWarnings in executor.map(worker, jobs):
+                data.update(part)
+                if warnings is not None:
+                    warnings.extend(partWarnings)
+    countParsed(data, metrics)
     return data
+
+def countParsed(data, metrics):
+    # Record the cross sections and profiles in parseFile-format data
+    count(metrics, "crossSections", len(data))
+    count(metrics, "profiles", sum([len(xsData) - len(NODE_FIELDS) for xsData in data.values()]))
+
+def parseFile(text, nodes = None, entryList = None, workers = None, cache = None, metrics = None, warnings = None,
+              engine = "split", compact = False):
+    # Extract cross-section data from file
+    # If nodes (riverNode dictionaries) or entryList are given, only those cross sections and entries are parsed
+    # If workers is more than 1, the text is split at cross-section boundaries and parsed in that many processes
+    # cache, metrics, warnings, engine and compact are as for parseReport
+    engineFor(engine)
+    keys = None if nodes is None else nodeKeys(nodes)
+    directory = None if warnings is not None else cacheDir(cache)
+    if directory is not None:
+        with stage(metrics, "cache"):
+            parse = lambda: parseFile(text, nodes, entryList, workers, cache = False, metrics = metrics,
+                                      engine = engine, compact = compact)
+            return cachedParse(directory, textHash(text), keys, entryList, parse, engine, compact)
+    count(metrics, "bytesRead", len(text))
+    if workers is not None and workers > 1:
+        parts = textParts(text, workers * PARTS_PER_WORKER)
+        jobs = [(part, keys, entryList, warnings is not None, engine, compact) for part in parts]
+        return parseParallel(parseText, jobs, workers, metrics, warnings)
+    # Cross sections are split off lazily, so the full list of them is never held alongside the text
+    # Filter out non-cross-section entries at beginning
+    schema = Schema() if compact else None
+    return collectXs(parsePieces(iterSplit(text, XS_MARKER), keys, entryList, metrics, warnings, engine, schema))
+
+def parseReport(path, nodes = None, entryList = None, workers = None, cache = None, metrics = None, warnings = None,
+                engine = "split", compact = False):
+    # Same as parseFile(getReportFile(path)), but streams the report rather than reading it into memory
+    # If workers is more than 1, the report is split into byte ranges at cross-section boundaries, which are read
+    # and parsed in that many processes
+    # Results are cached (see reportCache) in the directory cache, or reportCache.CACHE_DIR if cache is None, and
+    # loaded from there while the report is unchanged; cache = False disables this
+    # If metrics (a RunMetrics; see metrics.py) is given, stage times and counts are recorded in it
+    # If warnings (a WarningTable; see reportWarnings) is given, the warnings of the parsed cross sections are added to
+    # it; the cache only holds the data, so it isn't used
+    # engine chooses how the output tables are tokenized: "split" (the default; values are strings) or "fixed" (by
+    # column position, with values parsed to floats); see fixedEntries
+    # If compact is True, each profile is a read-only ProfileRecord mapping of float values sharing one table of entry
+    # names, rather than a dictionary, which takes far less memory for a large report; see reportRecords
+    engineFor(engine)
+    keys = None if nodes is None else nodeKeys(nodes)
+    directory = None if warnings is not None else cacheDir(cache)
+    if directory is not None:
+        with stage(metrics, "cache"):
+            parse = lambda: parseReport(path, nodes, entryList, workers, cache = False, metrics = metrics,
+                                        engine = engine, compact = compact)
+            return cachedParse(directory, fileHash(path, directory), keys, entryList, parse, engine, compact)
+    if workers is not None and workers > 1:
+        count(metrics, "bytesRead", os.path.getsize(path))
+        ranges = reportRanges(path, workers * PARTS_PER_WORKER)
+        jobs = [(path, start, end, keys, entryList, warnings is not None, engine, compact) for start, end in ranges]
+        return parseParallel(parseRange, jobs, workers, metrics, warnings)
+    return collectXs(iterParseFile(path, nodes, entryList, metrics, warnings, engine, compact))
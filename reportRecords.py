@@ -0,0 +1,122 @@
+"""
+This component of the program stores parsed profiles compactly, for holding the data of a whole model in memory.
+
+By default, each profile parsed by reportReader is a dictionary of about 45 entries, with its own copies of the entry
+names (e.g. "W.S. Elev (ft)" or "Flow Area (sq ft).MC") and of the values as strings.  With compact = True (see
+parseFile), the entry names are instead kept once, in a Schema shared by all of the profiles of a report, which gives
+each entry a slot; each profile is a ProfileRecord holding its values in an array("d"), by slot.  Values which aren't
+numbers (e.g. "NA", or "Left OB" for Element) are kept as strings beside the array; missing entries are NaN in it.
+The same non-numeric values tend to come up in the same entries of many profiles, so their (slot, value) pairs, and
+the lists of them, are interned in the schema and shared between records.
+
+A ProfileRecord is a read-only mapping, so code like datum[pf][entry], pfData.get(entry) or pfData.items() works the
+same as with dictionaries; values are floats, as with the fixed engine.  benchmark.py measures the memory held by
+parsed data both ways (the "Kept MB" column).
+
+When a report is parsed in parallel, each part of the report has its own Schema, as the records are built in
+different processes.
+"""
+
+from array import array
+from collections.abc import Mapping
+
+NAN = float("nan")
+
+class Schema:
+    """
+    Shared table of entry names: fields[slot] is the entry in a slot and slots[entry] its slot, in the order the entries
+    are first found.  strings holds the values found not to be numbers, and texts the interned text of records.
+    """
+
+    def __init__(self, fields = ()):
+        self.fields = []
+        self.slots = {}
+        self.blank = array("d") # Values of a record with every entry missing
+        self.strings = set()
+        self.texts = {}
+        for field in fields:
+            self.slot(field)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def slot(self, field):
+        slot = self.slots.get(field)
+        if slot is None:
+            slot = self.slots[field] = len(self.fields)
+            self.fields.append(field)
+            self.blank.append(NAN)
+        return slot
+
+    def record(self, output):
+        # ProfileRecord of a profile's data as returned by entries or fixedEntries
+        slots = self.slots
+        for field in output:
+            if field not in slots:
+                self.slot(field)
+        data = self.blank[:]
+        text = []
+        strings = self.strings
+        texts = self.texts
+        for field, value in output.items():
+            # Known strings are checked first, as failing to convert them is slow
+            if value not in strings:
+                try:
+                    data[slots[field]] = float(value)
+                    continue
+                except ValueError:
+                    strings.add(value)
+            pair = (slots[field], value)
+            text.append(texts.setdefault(pair, pair))
+        if not text:
+            return ProfileRecord(self, data)
+        text = tuple(text)
+        return ProfileRecord(self, data, texts.setdefault(text, text))
+
+class ProfileRecord(Mapping):
+    """
+    Read-only mapping of entry names to values for one profile, stored by the slots of a Schema; see the module
+    documentation.
+
+    :param schema: the Schema shared by the report's profiles
+    :param data: array("d") of numeric values by slot, NaN where missing; it may be shorter than the schema, if entries
+                    were added to the schema after the record was made
+    :param text: ((slot, value), ...) of the non-numeric values, or None if there are none
+    """
+
+    __slots__ = ("schema", "data", "text")
+
+    def __init__(self, schema, data, text = None):
+        self.schema = schema
+        self.data = data
+        self.text = text
+
+    def __getitem__(self, field):
+        slot = self.schema.slots[field]
+        if slot < len(self.data):
+            value = self.data[slot]
+            if value == value: # Not NaN
+                return value
+        if self.text is not None:
+            for textSlot, value in self.text:
+                if textSlot == slot:
+                    return value
+        raise KeyError(field)
+
+    def __iter__(self):
+        # Entries in slot order
+        textSlots = () if self.text is None else set([slot for slot, _ in self.text])
+        fields = self.schema.fields
+        for slot, value in enumerate(self.data):
+            if value == value or slot in textSlots:
+                yield fields[slot]
+
+    def __len__(self):
+        return sum([1 for _ in self])
+
+    def __reduce__(self):
+        # The schema is pickled once for all of the records which share it, e.g. in a cached result
+        return (ProfileRecord, (self.schema, self.data, self.text))
+
+    def __repr__(self):
+        return "ProfileRecord(%r)" % dict(self.items())
@@ -0,0 +1,99 @@
+"""
+This component of the program provides a columnar, NumPy-based alternative to the nested dictionaries returned by
+reportReader's parseFile.
+
+A ReportTable holds the parsed values of a report as a single float64 array of shape (nodes, profiles, entries),
+alongside the node, profile and entry indices for each axis.  Values which are missing from a profile, or which are
+not numbers (e.g. the "NA" placeholders for missing LOB/ROB values), are NaN.  This allows statistics across profiles
+or nodes to be computed directly with NumPy, e.g. table.column("Q Total (cfs)").mean(axis = 1) for the mean flow at
+each node.
+
+Like the CSV reader and the flow scenario generators, this requires NumPy.
+"""
+
+from array import array
+import numpy as np
+from reportReader import iterParseFile, profileKeys, xsKey
+
+def toFloat(value):
+    # Parse a report value, with anything that isn't a number ("NA", "", "Left OB") becoming NaN
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+class ReportTable:
+    """
+    Parsed report data as a float64 array of shape (nodes, profiles, entries).
+
+    nodes is a list of {"river", "reach", "rs"} dictionaries, profiles a list of profile numbers (as strings, as in
+    parseFile), and entries a list of entry names; values[i, j, k] is entry k of profile j at node i.
+    """
+
+    def __init__(self, nodes, profiles, entries, values):
+        self.nodes = nodes
+        self.profiles = profiles
+        self.entries = entries
+        self.values = values
+        self.nodeIndex = {xsKey(node): ix for ix, node in enumerate(nodes)}
+        self.profileIndex = {pf: ix for ix, pf in enumerate(profiles)}
+        self.entryIndex = {entry: ix for ix, entry in enumerate(entries)}
+
+    @classmethod
+    def fromRecords(cls, xsDatas, entryList = None):
+        """
+        Build a table from parsed cross sections (e.g. from iterParseFile), converting each cross section as it
+        arrives so that the string data is never all held at once.
+
+        :param xsDatas: an iterable of parsed cross sections, as returned by parseXs
+        :param entryList: the entries (columns) to keep, in order; if None, every entry found is kept, in the order
+                            it is first found
+        """
+        nodes = []
+        profileIndex = {}
+        entryIndex = {} if entryList is None else {entry: ix for ix, entry in enumerate(entryList)}
+        # Coordinates and values of every parsed value, scattered into the array at the end
+        coords = array("q")
+        values = array("d")
+        for xsData in xsDatas:
+            ni = len(nodes)
+            nodes.append({"river": xsData["river"], "reach": xsData["reach"], "rs": xsData["rs"]})
+            for pf in profileKeys(xsData):
+                pfData = xsData[pf]
+                pi = profileIndex.setdefault(pf, len(profileIndex))
+                for entry, value in pfData.items():
+                    ei = entryIndex.get(entry)
+                    if ei is None:
+                        if entryList is not None:
+                            continue
+                        ei = entryIndex[entry] = len(entryIndex)
+                    coords.extend((ni, pi, ei))
+                    values.append(toFloat(value))
+        table = np.full((len(nodes), len(profileIndex), len(entryIndex)), np.nan)
+        if len(values) > 0:
+            ix = np.frombuffer(coords, dtype = np.int64).reshape(-1, 3)
+            table[ix[:, 0], ix[:, 1], ix[:, 2]] = np.frombuffer(values, dtype = np.float64)
+        return cls(nodes, list(profileIndex), list(entryIndex), table)
+
+    @classmethod
+    def fromData(cls, xsData, entryList = None):
+        # Build a table from the output of parseFile
+        return cls.fromRecords(xsData.values(), entryList)
+
+    def value(self, node, pf, entry):
+        # A single value; node is a riverNode dictionary or a parseFile key
+        key = node if isinstance(node, str) else xsKey(node)
+        return self.values[self.nodeIndex[key], self.profileIndex[str(pf)], self.entryIndex[entry]]
+
+    def column(self, entry):
+        # All values of one entry, as an array of shape (nodes, profiles)
+        return self.values[:, :, self.entryIndex[entry]]
+
+    def select(self, nodes):
+        # A table with only the given nodes (riverNode dictionaries), in that order; missing nodes are skipped
+        ixs = [self.nodeIndex[xsKey(node)] for node in nodes if xsKey(node) in self.nodeIndex]
+        return ReportTable([self.nodes[ix] for ix in ixs], self.profiles, self.entries, self.values[ixs])
+
+def tableFromReport(path, nodes = None, entryList = None):
+    # Parse a report straight into a ReportTable, streaming it as iterParseFile does
+    return ReportTable.fromRecords(iterParseFile(path, nodes, entryList), entryList)
@@ -0,0 +1,131 @@
+"""
+This component of the program collects the warnings, errors and notes which HEC-RAS writes after the output table of
+a profile, e.g.:
+
+Warning: The energy equation could not be balanced within the specified number of iterations.  The program used critical
+         depth for the water surface and continued on with the calculations.
+
+so that unstable profiles can be found without searching the report again.  They are collected in the same pass as
+the rest of the report by passing a WarningTable as the warnings argument of parseFile, parseReport or convertCSV.
+
+Each message is a line starting with "Warning:", "Error:" or "Note:", joined with its indented continuation lines.
+Messages are interned to integer codes: the common messages in COMMON_WARNINGS always have the same codes (their
+positions in the list), and any others get the next codes in the order they are found.  The table stores one row per
+message per profile, as (river, reach, rs, profile, code), with each column interned in the same way as a categorical,
+so a table for a whole model stays small.
+
+writeWarningsCSV exports a table in the format:
+River,Reach,RS,Profile,Code,Message
+"""
+
+from array import array
+import re
+
+# Messages with fixed codes, as they come up in most models
+COMMON_WARNINGS = [
+    "Warning: The energy equation could not be balanced within the specified number of iterations.  The program used "
+    "critical depth for the water surface and continued on with the calculations.",
+    "Warning: During the standard step iterations, when the assumed water surface was set equal to critical depth, "
+    "the calculated water surface came back below critical depth.  This indicates that there is not a valid "
+    "subcritical answer.  The program defaulted to critical depth.",
+    "Warning: The cross-section end points had to be extended vertically for the computed water surface.",
+    "Warning: Divided flow computed for this cross-section.",
+    "Warning: The velocity head has changed by more than 0.5 ft (0.15 m).  This may indicate the need for additional "
+    "cross sections.",
+    "Warning: The energy loss was greater than 1.0 ft (0.3 m). between the current and previous cross section.  This "
+    "may indicate the need for additional cross sections.",
+    "Warning: The conveyance ratio (upstream conveyance divided by downstream conveyance) is less than 0.7 or "
+    "greater than 1.4.  This may indicate the need for additional cross sections.",
+    "Warning: The parabolic search method failed to converge on critical depth.  The program will try the cross "
+    "section slice/secant method to find critical depth."
+]
+
+# Start of a message, at the start of a line
+MESSAGE_START = re.compile(r"^(?:Warning|Error|Note):", re.MULTILINE)
+
+def messages(profile):
+    # Messages in the text of a profile (as from reportReader.profiles), with continuation lines joined
+    found = []
+    for match in MESSAGE_START.finditer(profile):
+        lines = []
+        for line in profile[match.start():].split("\n"):
+            # The message continues on indented lines, up to a blank line or the next message
+            if lines and (line.strip() == "" or not line[0].isspace()):
+                break
+            lines.append(line.strip())
+        found.append(" ".join(lines))
+    return found
+
+class Interned:
+    # Categorical values: codes[value] is the code of value, and values[code] the value
+    def __init__(self, values = ()):
+        self.values = []
+        self.codes = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class WarningTable:
+    """
+    Table of the messages in a report; see the module documentation.
+
+    nodes.values are (river, reach, rs) tuples, profiles.values profile numbers (as in the keys of parseFile's
+    output) and messages.values the message texts; node, profile and code are array("i") columns of codes into them.
+    """
+
+    def __init__(self):
+        self.nodes = Interned()
+        self.profiles = Interned()
+        self.messages = Interned(COMMON_WARNINGS)
+        self.node = array("i")
+        self.profile = array("i")
+        self.code = array("i")
+
+    def __len__(self):
+        return len(self.code)
+
+    def add(self, node, profile, message):
+        # Add a message for (river, reach, rs) node and profile, returning its code
+        code = self.messages.code(message)
+        self.node.append(self.nodes.code(node))
+        self.profile.append(self.profiles.code(profile))
+        self.code.append(code)
+        return code
+
+    def addProfile(self, xsData, pnum, profile):
+        # Add the messages in the text of one profile of a parsed cross section
+        if "Warning:" in profile or "Error:" in profile or "Note:" in profile:
+            for message in messages(profile):
+                self.add((xsData["river"], xsData["reach"], xsData["rs"]), pnum, message)
+
+    def extend(self, other):
+        # Add the rows of another table, e.g. from another part of the same report
+        for row in other.rows():
+            self.add(row[0:3], row[3], row[5])
+
+    def rows(self):
+        # Rows of (river, reach, rs, profile, code, message), in the order they were found
+        for node, profile, code in zip(self.node, self.profile, self.code):
+            yield self.nodes.values[node] + (self.profiles.values[profile], code, self.messages.values[code])
+
+    def flagged(self, codes = None):
+        # Set of ("river reach rs" key, profile) with any message, or with one of the given codes, for filtering
+        # parseFile's output
+        return set([(" ".join(row[0:3]), row[3]) for row in self.rows() if codes is None or row[4] in codes])
+
+def csvField(value):
+    # Messages contain commas, so quote them as needed
+    value = str(value)
+    return '"%s"' % value.replace('"', '""') if "," in value or '"' in value else value
+
+def writeWarningsCSV(table, path):
+    with open(path, "w") as f:
+        f.write("River,Reach,RS,Profile,Code,Message")
+        for row in table.rows():
+            f.write("\n" + ",".join([csvField(value) for value in row]))
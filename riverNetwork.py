@@ -0,0 +1,95 @@
+"""
+This component of the program models a river network as a directed acyclic graph of nodes (cross sections where flows
+are specified), so that the flow at every node can be found from the flows entering the network.
+
+Nodes are riverNode-style dictionaries of "river", "reach" and "rs", and are referred to by their flow headers (from
+mkFlowHeader).  Each edge (upstream, downstream) means that the flow at the upstream node passes on to the downstream
+node; an optional third item gives the fraction of the flow which does so, for a split.  A node with no edges into it
+is a source, whose flows are given by each scenario; the flow at any other node is the sum of the flows passed on to it
+by the nodes immediately upstream.
+
+The network is topologically sorted once, and the accumulation operator is precomputed from the sort: a matrix of
+shape (nodes, sources) in which entry [i, j] is the fraction of source j's flow which reaches node i.  The flows at
+every node for a batch of scenarios are then a single matrix product.
+
+Example, for the LA River nodes in main.py:
+    network = RiverNetwork(nodes, [(compton, belowCC), (rioHondo, rhToCC), (aboveRH, rhToCC), (rhToCC, belowCC)])
+    flows = network.flows(sourceFlows) # sourceFlows has shape (sources, profiles)
+"""
+
+import numpy as np
+from profileWriter import mkFlowHeader
+
+class RiverNetwork:
+    """
+    A river network; see the module documentation.
+
+    :param nodes: the nodes, each a dictionary of "river", "reach" and "rs"
+    :param edges: (upstream, downstream) or (upstream, downstream, fraction) tuples of node flow headers
+    """
+
+    def __init__(self, nodes, edges):
+        self.nodes = nodes
+        self.keys = [mkFlowHeader(node["river"], node["reach"], node["rs"]) for node in nodes]
+        self.index = {key: ix for ix, key in enumerate(self.keys)}
+        self.upstream = {key: [] for key in self.keys} # {node: [(upstream node, fraction)]}
+        for edge in edges:
+            up, down = edge[0:2]
+            for key in [up, down]:
+                if key not in self.index:
+                    raise ValueError("Error: edge node %s is not in the network" % key)
+            self.upstream[down].append((up, edge[2] if len(edge) > 2 else 1.0))
+        # Sources in node order, so that scenarios give their flows in a predictable order
+        self.sources = [key for key in self.keys if self.upstream[key] == []]
+        self.order = self.topologicalOrder()
+        self.accumulation = self.accumulationMatrix()
+
+    def topologicalOrder(self):
+        # Node keys ordered so that every node comes after all of the nodes upstream of it (Kahn's algorithm)
+        downstream = {key: [] for key in self.keys}
+        remaining = {}
+        for key, ups in self.upstream.items():
+            remaining[key] = len(ups)
+            for up, _ in ups:
+                downstream[up].append(key)
+        order = [key for key in self.keys if remaining[key] == 0]
+        for key in order: # order grows as nodes are freed
+            for down in downstream[key]:
+                remaining[down] -= 1
+                if remaining[down] == 0:
+                    order.append(down)
+        if len(order) != len(self.keys):
+            raise ValueError("Error: the river network has a cycle through nodes: %s" %
+                             [key for key in self.keys if remaining[key] > 0])
+        return order
+
+    def accumulationMatrix(self):
+        # Fraction of each source's flow reaching each node, of shape (nodes, sources), built in topological order
+        column = {key: ix for ix, key in enumerate(self.sources)}
+        matrix = np.zeros((len(self.keys), len(self.sources)))
+        for key in self.order:
+            row = matrix[self.index[key]]
+            if key in column:
+                row[column[key]] = 1.0
+            for up, fraction in self.upstream[key]:
+                row += fraction * matrix[self.index[up]]
+        return matrix
+
+    def flows(self, sourceFlows):
+        """
+        Flows at every node for a batch of scenarios.
+
+        :param sourceFlows: flows at the sources (in the order of self.sources), of shape (sources, profiles)
+        :return: flows at every node (in the order of self.nodes), of shape (nodes, profiles)
+        """
+        return self.accumulation @ np.asarray(sourceFlows, dtype = np.float64).reshape(len(self.sources), -1)
+
+    def profiledata(self, sourceFlows):
+        # Flows at every node in the profiledata format of buildFile
+        return {key: flows for key, flows in zip(self.keys, self.flows(sourceFlows).tolist())}
+
+def networkFromUpstream(nodes, upstreamNodes):
+    # Network from the {node: [upstream nodes]} format of generatePermutedFlows, with an edge from each listed
+    # upstream node to the node; entries for nodes which are not in the network are ignored
+    keys = set([mkFlowHeader(node["river"], node["reach"], node["rs"]) for node in nodes])
+    return RiverNetwork(nodes, [(up, key) for key, ups in upstreamNodes.items() if key in keys for up in ups])
@@ -0,0 +1,179 @@
+"""
+This component of the program generates flow scenarios: sets of flow profiles covering combinations of flows at the
+upstream nodes of a model, with each downstream node's flow being the sum of the flows upstream of it.
+
+FactorialDesign is the full-factorial design used by utils.generatePermutedFlows: every combination of the given flows
+across the unconstrained (furthest-upstream) nodes, nflows ** nodes profiles in all.  Profile ix (from 0) gives
+unconstrained node nn the flow with index (ix // nflows ** (nodes - nn - 1)) % nflows, so the first node changes
+slowest and the last fastest.  Rather than being built up as lists, the design is computed with NumPy index
+arithmetic, a chunk of profiles at a time, so a design too big to hold in memory can be streamed straight to a flow
+CSV.  The unconstrained nodes are the sources of a RiverNetwork (see riverNetwork.py), and the flows at every node are
+found as a single matrix product of their flows with the network's accumulation matrix.
+
+SampledDesign is a much smaller alternative for when the full factorial needs too many profiles: a given number of
+profiles whose unconstrained flows are spread over a flow range by a space-filling sample.  Sampling methods:
+    * "lhs": Latin hypercube; each unconstrained node's range is split into nprofiles equal strata, each sampled once
+    * "halton": Halton sequence, randomly shifted
+    * "sobol": scrambled Sobol sequence; requires SciPy, and works best with a power of 2 profiles
+    * "random": independent uniform samples
+Flows are spread uniformly over the range, or log-uniformly (i.e. uniformly over the logarithm of the flows, so that
+each order of magnitude gets as many profiles) if logScale is True, which suits ranges like upstreamFlowRange in
+main.py.  The same seed always gives the same design.
+
+Profiles are numbered from 1 in the CSV and profile data, as elsewhere.
+"""
+
+import numpy as np
+from riverNetwork import RiverNetwork, networkFromUpstream
+
+try:
+    from scipy.stats import qmc
+except ImportError:
+    qmc = None
+
+# Profiles computed at a time when streaming a design
+CHUNK_PROFILES = 65536
+
+class Design:
+    """
+    Base class of flow designs: a set of scenarios giving flows at the sources of a RiverNetwork, from which the flows
+    at every node are found.  Subclasses set nprofiles and implement sourceFlows.
+
+    :param nodes: the nodes, each a dictionary of "river", "reach" and "rs"
+    :param network: a RiverNetwork of the nodes, or {node: [upstream nodes]} as for generatePermutedFlows; nodes with
+                    nothing upstream of them are unconstrained
+    """
+
+    def __init__(self, nodes, network):
+        if not isinstance(network, RiverNetwork):
+            network = networkFromUpstream(nodes, network)
+        self.nodes = network.nodes
+        self.keys = network.keys
+        self.free = network.sources
+        self.network = network
+        self.nprofiles = 0
+
+    def sourceFlows(self, start, stop):
+        # Flows at the unconstrained nodes for profiles start to stop (from 0), of shape (free nodes, profiles)
+        raise NotImplementedError
+
+    def nodeFlows(self, start, stop):
+        # Flows at every node for profiles start to stop (from 0), of shape (nodes, profiles)
+        return self.network.flows(self.sourceFlows(start, stop))
+
+    def chunks(self, chunkProfiles = CHUNK_PROFILES):
+        # Yield (first profile number, flows of shape (nodes, profiles)) for successive chunks of the design
+        for start in range(0, self.nprofiles, chunkProfiles):
+            yield start + 1, self.nodeFlows(start, min(start + chunkProfiles, self.nprofiles))
+
+    def profiledata(self, keys = None):
+        # The whole design in the profiledata format of buildFile, for the given nodes (by default all of them)
+        flows = self.nodeFlows(0, self.nprofiles)
+        keys = self.keys if keys is None else keys
+        return {key: flows[self.keys.index(key)].tolist() for key in keys}
+
+    def writeCSV(self, path, chunkProfiles = CHUNK_PROFILES):
+        """
+        Stream the design to a flow CSV (see csvReader) with flows at every node, one chunk of profiles at a time.
+        Within each chunk, rows are grouped by node, so a design in a single chunk is written node by node.
+        """
+        prefixes = ["%s,%s,%s" % (node["river"], node["reach"], node["rs"]) for node in self.nodes]
+        with open(path, "w") as f:
+            f.write("river,reach,rs,profilenumber,flow")
+            for first, flows in self.chunks(chunkProfiles):
+                profiles = np.arange(first, first + flows.shape[1]).tolist()
+                for prefix, nodeFlows in zip(prefixes, flows.tolist()):
+                    # Each node's rows are formatted in one operation, alternating profile numbers and flows
+                    values = [value for pair in zip(profiles, nodeFlows) for value in pair]
+                    f.write(("\n" + prefix.replace("%", "%%") + ",%d,%f") * len(profiles) % tuple(values))
+
+class FactorialDesign(Design):
+    """
+    Full-factorial flow design; see the module documentation.
+
+    :param flows: the flow rates (in cfs) to combine
+    :param nodes, network: as for Design
+    """
+
+    def __init__(self, flows, nodes, network):
+        Design.__init__(self, nodes, network)
+        self.flows = np.asarray(flows, dtype = np.float64)
+        # Python integer, as the number of profiles can be very large
+        self.nprofiles = len(self.flows) ** len(self.free)
+
+    def indices(self, start, stop):
+        # Flow indices of the unconstrained nodes for profiles start to stop (from 0), of shape (profiles, free nodes)
+        ix = np.arange(start, stop, dtype = np.int64)
+        powers = len(self.flows) ** np.arange(len(self.free) - 1, -1, -1, dtype = np.int64)
+        return (ix[:, np.newaxis] // powers) % len(self.flows)
+
+    def sourceFlows(self, start, stop):
+        return self.flows[self.indices(start, stop)].T
+
+# First primes, for the bases of Halton sequences; enough for as many unconstrained nodes as any model is likely to have
+PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97]
+
+def latinHypercube(n, d, rng):
+    # n points in the unit d-cube, one in each of the n strata of every dimension
+    return (np.array([rng.permutation(n) for _ in range(d)]).T + rng.random((n, d))) / n
+
+def halton(n, d, rng):
+    # n points of the d-dimensional Halton sequence (skipping the first point, 0), with a random shift modulo 1
+    if d > len(PRIMES):
+        raise ValueError("Error: Halton sampling supports at most %d unconstrained nodes" % len(PRIMES))
+    points = np.zeros((n, d))
+    for dim, base in enumerate(PRIMES[0:d]):
+        ix = np.arange(1, n + 1)
+        scale = 1.0
+        while ix.any():
+            # Radical inverse: the digits of ix in this base, reflected about the point
+            scale /= base
+            ix, digit = np.divmod(ix, base)
+            points[:, dim] += digit * scale
+    return (points + rng.random(d)) % 1.0
+
+def sobol(n, d, rng):
+    if qmc is None:
+        raise ImportError("Sobol sampling requires SciPy")
+    return qmc.Sobol(d, scramble = True, seed = rng).random(n)
+
+def uniform(n, d, rng):
+    return rng.random((n, d))
+
+SAMPLERS = {"lhs": latinHypercube, "halton": halton, "sobol": sobol, "random": uniform}
+
+class SampledDesign(Design):
+    """
+    Flow design of a set number of sampled profiles; see the module documentation.
+
+    :param nodes, network: as for Design
+    :param nprofiles: the number of profiles to generate
+    :param low, high: the flow range (in cfs), either a single range for all unconstrained nodes or a list of values
+                        for each unconstrained node (in the order of the network's sources)
+    :param method: the sampling method: "lhs", "halton", "sobol" or "random"
+    :param logScale: whether to sample the flows log-uniformly rather than uniformly
+    :param seed: random seed, for a reproducible design
+    """
+
+    def __init__(self, nodes, network, nprofiles, low, high, method = "lhs", logScale = False, seed = None):
+        Design.__init__(self, nodes, network)
+        if method not in SAMPLERS:
+            raise ValueError("Error: unknown sampling method %s; expected one of %s" % (method, list(SAMPLERS)))
+        low = np.broadcast_to(np.asarray(low, dtype = np.float64), (len(self.free),))
+        high = np.broadcast_to(np.asarray(high, dtype = np.float64), (len(self.free),))
+        if logScale:
+            if (low <= 0).any():
+                raise ValueError("Error: log-uniform sampling needs flows greater than 0")
+            low, high = np.log(low), np.log(high)
+        self.nprofiles = nprofiles
+        self.method = method
+        self.logScale = logScale
+        self.seed = seed
+        # The sample is small enough (it exists to keep the number of profiles down) to compute in full here
+        unit = SAMPLERS[method](nprofiles, len(self.free), np.random.default_rng(seed))
+        self.samples = low + unit * (high - low)
+        if logScale:
+            self.samples = np.exp(self.samples)
+
+    def sourceFlows(self, start, stop):
+        return self.samples[start:stop].T
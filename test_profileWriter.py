@@ -0,0 +1,50 @@
+"""
+Tests of the flow data formatting in profileWriter, covering every length of the last row.
+
+Run with: python -m pytest test_profileWriter.py
+"""
+
+import numpy as np
+import pytest
+from profileWriter import FLOWS_PER_ROW, mkFlowData, mkFlowBlocks
+
+WIDTH = 8 # Characters per flow
+
+def flowsOf(n):
+    # n distinct flows, small enough to fit in WIDTH characters
+    return [float(i) + 0.5 for i in range(0, n)]
+
+@pytest.mark.parametrize("n", range(0, 32))
+def testRowCount(n):
+    assert len(mkFlowData(flowsOf(n))) == -(-n // FLOWS_PER_ROW)
+
+@pytest.mark.parametrize("n", range(0, 32))
+def testRowWidths(n):
+    rows = mkFlowData(flowsOf(n))
+    for row in rows[:-1]:
+        assert len(row) == WIDTH * FLOWS_PER_ROW
+    if rows:
+        assert len(rows[-1]) == WIDTH * (n % FLOWS_PER_ROW or FLOWS_PER_ROW)
+
+@pytest.mark.parametrize("n", range(0, 32))
+def testValues(n):
+    # Every flow is written, in order, including the last one when it is alone on its row
+    rows = mkFlowData(flowsOf(n))
+    values = [float(row[i:i + WIDTH]) for row in rows for i in range(0, len(row), WIDTH)]
+    assert values == flowsOf(n)
+
+@pytest.mark.parametrize("n", [1, 11, 21, 31])
+def testSingleLastValue(n):
+    rows = mkFlowData(flowsOf(n))
+    assert rows[-1] == "%8.1f" % flowsOf(n)[-1]
+
+@pytest.mark.parametrize("n", range(0, 32))
+def testNumPyFlows(n):
+    assert mkFlowData(np.array(flowsOf(n))) == mkFlowData(flowsOf(n))
+
+@pytest.mark.parametrize("n", [0, 1, 9, 10, 11, 21, 25])
+def testFlowBlocks(n):
+    matrix = [flowsOf(n), [2 * flow for flow in flowsOf(n)], [flow + 100 for flow in flowsOf(n)]]
+    expected = [mkFlowData(flows) for flows in matrix]
+    assert mkFlowBlocks(matrix) == expected
+    assert mkFlowBlocks(np.array(matrix).reshape(3, n)) == expected